@@ -0,0 +1,165 @@
+from pydantic import ValidationError, create_model
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import insert, update, bindparam
+from app.models.batch import BatchError
+from typing import Any, Optional
+from uuid import UUID
+from functools import lru_cache
+
+# Rows per INSERT statement, to stay below the bind parameter limit
+INSERT_CHUNK_SIZE = 1000
+
+
+def validate_items(
+    items: list[Any],
+    model: type[SQLModel],
+) -> tuple[list[tuple[int, SQLModel]], list[BatchError]]:
+    """Validate each item of a batch, collecting errors per item"""
+
+    valid = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, model.parse_obj(item)))
+        except ValidationError as e:
+            errors.append(BatchError(index=index, detail=e.errors()))
+        except (KeyError, TypeError, ValueError):
+            # Raised by the pre root validators on items of the wrong shape
+            errors.append(BatchError(index=index, detail="Invalid item"))
+
+    return valid, errors
+
+
+@lru_cache()
+def partial_model(
+    model: type[SQLModel],
+) -> type[SQLModel]:
+    """A model with the fields and validators of an update model, all of
+    them optional, to validate only the fields sent in a partial update"""
+
+    return create_model(
+        f"Partial{model.__name__}",
+        __base__=model,
+        **{
+            name: (Optional[field.outer_type_], None)
+            for name, field in model.__fields__.items()
+        },
+    )
+
+
+def validate_updates(
+    items: list[Any],
+    model: type[SQLModel],
+) -> tuple[list[tuple[int, UUID, dict[str, Any]]], list[BatchError]]:
+    """Validate each partial update of a batch, given with the id to update
+
+    Returns the fields set by each update, without the coordinates that the
+    update models convert to a geometry. Fields that are not sent are left
+    unchanged, and only the fields that allow it can be set to null.
+    """
+
+    partial = partial_model(model)
+    valid = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise TypeError
+            id = UUID(str(item["id"]))
+        except (KeyError, TypeError, ValueError):
+            errors.append(BatchError(index=index, detail="Invalid id"))
+            continue
+
+        try:
+            update = partial.parse_obj(
+                {key: value for key, value in item.items() if key != "id"}
+            )
+        except ValidationError as e:
+            errors.append(BatchError(index=index, detail=e.errors()))
+            continue
+        except (KeyError, TypeError, ValueError):
+            errors.append(BatchError(index=index, detail="Invalid item"))
+            continue
+
+        values = update.dict(
+            exclude_unset=True,
+            exclude={"latitude", "longitude", "elevation"},
+        )
+        null_fields = [
+            field
+            for field, value in values.items()
+            if value is None and not model.__fields__[field].allow_none
+        ]
+        if null_fields:
+            errors.append(
+                BatchError(
+                    index=index,
+                    detail=[
+                        {
+                            "loc": [field],
+                            "msg": "none is not an allowed value",
+                            "type": "type_error.none.not_allowed",
+                        }
+                        for field in null_fields
+                    ],
+                )
+            )
+            continue
+
+        valid.append((index, id, values))
+
+    return valid, errors
+
+
+async def existing_ids(
+    session: AsyncSession,
+    column: Any,
+    ids: set[UUID],
+) -> set[UUID]:
+    """The given ids that exist in a UUID column, in one query"""
+
+    if not ids:
+        return set()
+
+    res = await session.execute(select(column).where(column.in_(ids)))
+
+    return set(res.scalars().all())
+
+
+async def insert_rows(
+    session: AsyncSession,
+    model: type[SQLModel],
+    rows: list[dict[str, Any]],
+) -> None:
+    """Insert rows with multi-row INSERT statements"""
+
+    for i in range(0, len(rows), INSERT_CHUNK_SIZE):
+        await session.execute(
+            insert(model).values(rows[i : i + INSERT_CHUNK_SIZE])
+        )
+
+
+async def update_rows(
+    session: AsyncSession,
+    model: type[SQLModel],
+    updates: dict[UUID, dict[str, Any]],
+) -> None:
+    """Update rows by id, with one executemany per set of updated fields"""
+
+    groups: dict[tuple, list[dict]] = {}
+    for id, values in updates.items():
+        fields = tuple(sorted(values))
+        groups.setdefault(fields, []).append(
+            {"b_id": id, **{f"b_{field}": values[field] for field in fields}}
+        )
+
+    for fields, params in groups.items():
+        if not fields:
+            continue
+        statement = (
+            update(model)
+            .where(model.id == bindparam("b_id"))
+            .values({field: bindparam(f"b_{field}") for field in fields})
+        )
+        await session.execute(statement, params)
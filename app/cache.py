@@ -0,0 +1,126 @@
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Hashable
+from sqlmodel import SQLModel
+import threading
+import time
+
+
+class Cache:
+    """A least recently used in-process cache
+
+    The cache is bounded by the total size of its values, as given by
+    `sizeof` (one per entry by default), and entries can optionally expire
+    after `ttl` seconds. When `group` is given, the keys are indexed by
+    group(key) so that all the entries of a group can be popped at once.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float | None = None,
+        sizeof: Callable[[Any], int] = lambda value: 1,
+        group: Callable[[Hashable], Hashable] | None = None,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.group = group
+        self.size = 0
+
+        self._entries: OrderedDict = OrderedDict()
+        self._groups: defaultdict = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        key: Hashable,
+        default: Any = None,
+    ) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                return default
+
+            self._entries.move_to_end(key)
+
+            return value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+    ) -> None:
+        size = self.sizeof(value)
+        if size > self.max_size:
+            return  # Never evict everything for a single oversized value
+
+        expires_at = None
+        if self.ttl is not None:
+            expires_at = time.monotonic() + self.ttl
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self.size += size
+            if self.group is not None:
+                self._groups[self.group(key)].add(key)
+
+            while self.size > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def pop(
+        self,
+        key: Hashable,
+    ) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def pop_group(
+        self,
+        group: Hashable,
+    ) -> None:
+        with self._lock:
+            for key in list(self._groups.get(group, ())):
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+            self.size = 0
+
+    def _remove(
+        self,
+        key: Hashable,
+    ) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        self.size -= entry[1]
+        if self.group is not None:
+            keys = self._groups[self.group(key)]
+            keys.discard(key)
+            if not keys:
+                del self._groups[self.group(key)]
+
+
+# Version of the data in each table, bumped by the handlers that write to
+# it. Caches include the version in their keys so writes invalidate them.
+_data_versions: dict[str, int] = defaultdict(int)
+
+
+def data_version(model: type[SQLModel]) -> int:
+    return _data_versions[model.__tablename__]
+
+
+def data_changed(*models: type[SQLModel]) -> None:
+    """Invalidate the cached data derived from the tables of these models"""
+
+    for model in models:
+        _data_versions[model.__tablename__] += 1
@@ -16,6 +16,56 @@ class Config(BaseSettings):
 
     DB_URL: str | None = None
 
+    # Engine and connection pool settings
+    DB_ECHO: bool = False  # Log all SQL statements
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_STATEMENT_TIMEOUT_MS: int = 30000  # 0 disables the timeout
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100  # asyncpg, per connection
+    DB_CONNECT_TIMEOUT_SECONDS: float = 10
+
+    # Read replicas used by GET endpoints, as a JSON list of database URLs
+    DB_REPLICA_URLS: list[str] = []
+    DB_REPLICA_RETRY_SECONDS: float = 30  # Skip a failed replica this long
+    DB_READ_YOUR_WRITES_SECONDS: float = 5  # Read from primary after a write
+
+    # Serialize list endpoints from plain rows with orjson, skipping the
+    # per-row validation of the response models
+    FAST_LIST_RESPONSES: bool = False
+
+    # Total counts of list endpoints (Content-Range)
+    COUNT_CACHE_TTL_SECONDS: float = 10
+    COUNT_ESTIMATE_MIN_ROWS: int = 100000  # Estimate unfiltered counts above
+
+    # How long clients may cache the LICOR files and datasets, which never
+    # change after upload, without revalidating
+    LICOR_DATA_MAX_AGE_SECONDS: int = 86400
+
+    # In-process cache of the datasets of licor records, by the size of
+    # their JSON. Each dataset is cached on its own. Cached datasets are
+    # served without reading the record, so a record deleted by another
+    # worker can be served for up to the TTL.
+    LICOR_DATASET_CACHE_MAX_BYTES: int = 128 * 1024 * 1024
+    LICOR_DATASET_CACHE_TTL_SECONDS: float = 300
+    LICOR_DOWNSAMPLE_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+
+    # Largest LICOR file accepted by the upload endpoint, in bytes
+    LICOR_UPLOAD_MAX_BYTES: int = 128 * 1024 * 1024
+
+    # gzip level of the LICOR files stored at upload, and the level and
+    # smallest body of the responses compressed for clients accepting gzip
+    LICOR_GZIP_LEVEL: int = 6
+    GZIP_LEVEL: int = 5
+    GZIP_MINIMUM_SIZE: int = 1000
+
+    # In-process cache of the vector tiles of sites and subsites. Writes
+    # handled by other processes are seen after the TTL, which is also how
+    # long clients may cache the tiles.
+    TILE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    TILE_CACHE_TTL_SECONDS: int = 60
+
     @root_validator(pre=True)
     def form_db_url(cls, values: dict) -> dict:
         """Form the DB URL from the settings"""
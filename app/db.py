@@ -1,18 +1,162 @@
+from fastapi import Request, Response
 from sqlmodel import create_engine
 from sqlmodel.ext.asyncio.session import AsyncSession, AsyncEngine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.exc import SQLAlchemyError
 from app.config import config
-import sys
+import itertools
+import math
+import time
 
+# Created on application startup by init_db()
+engine: AsyncEngine | None = None
+async_session: sessionmaker | None = None
+replica_engines: list[AsyncEngine] = []
+replica_sessions: list[sessionmaker] = []
 
-# Don't load engine if pytest is running
-if "pytest" not in sys.modules:
-    engine = AsyncEngine(create_engine(config.DB_URL, echo=True, future=True))
+# Round-robin over the replicas, skipping those that recently failed
+_next_replica = itertools.count()
+_replica_down_until: dict[int, float] = {}
 
+# Cookie holding the time until which a client that committed a write reads
+# from the primary. It is carried by the client, so that any process
+# serving its next reads sees it.
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+
+def create_db_engine(url: str) -> AsyncEngine:
+    """Create an engine using the pool settings of the config"""
+
+    kwargs = {"echo": config.DB_ECHO, "future": True}
+
+    if url.startswith("postgresql"):
+        kwargs.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_pre_ping=config.DB_POOL_PRE_PING,
+            pool_recycle=config.DB_POOL_RECYCLE_SECONDS,
+        )
+
+    if url.startswith("postgresql+asyncpg"):
+        server_settings = {}
+        if config.DB_STATEMENT_TIMEOUT_MS:
+            server_settings["statement_timeout"] = str(
+                config.DB_STATEMENT_TIMEOUT_MS
+            )
+        kwargs["connect_args"] = {
+            "server_settings": server_settings,
+            "prepared_statement_cache_size": (
+                config.DB_PREPARED_STATEMENT_CACHE_SIZE
+            ),
+            "timeout": config.DB_CONNECT_TIMEOUT_SECONDS,
+        }
+
+    return AsyncEngine(create_engine(url, **kwargs))
+
+
+def create_session_factory(engine: AsyncEngine) -> sessionmaker:
+    return sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def init_db() -> None:
+    """Create the engines and session factories, once per process"""
+
+    global engine, async_session, replica_engines, replica_sessions
+
+    engine = create_db_engine(config.DB_URL)
+    async_session = create_session_factory(engine)
+
+    replica_engines = [create_db_engine(url) for url in config.DB_REPLICA_URLS]
+    replica_sessions = [create_session_factory(e) for e in replica_engines]
+
+
+async def close_db() -> None:
+    """Close all pooled connections"""
+
+    global engine, async_session, replica_engines, replica_sessions
+
+    for db_engine in [engine, *replica_engines]:
+        if db_engine is not None:
+            await db_engine.dispose()
+
+    engine = None
+    async_session = None
+    replica_engines = []
+    replica_sessions = []
+
+
+def reads_from_primary(request: Request) -> bool:
+    """Whether the reads of a request must go to the primary, as asked by
+    the X-Read-Primary header or the cookie of a recent write"""
+
+    if request.headers.get("X-Read-Primary", "").lower() == "true":
+        return True
+
+    try:
+        until = float(request.cookies.get(READ_PRIMARY_COOKIE, "0"))
+    except ValueError:
+        return False
+
+    return time.time() < until
+
+
+def _replica_order() -> list[int]:
+    """The replicas to try, starting from the next in the round-robin"""
+
+    now = time.monotonic()
+    first = next(_next_replica)
+    order = [
+        (first + offset) % len(replica_sessions)
+        for offset in range(len(replica_sessions))
+    ]
+
+    return [i for i in order if _replica_down_until.get(i, 0) <= now]
+
+
+async def get_session(response: Response) -> AsyncSession:
+    def wrote(session: Session) -> None:
+        # Send this client's reads to the primary for a short while, from
+        # the commit of its write
+        until = time.time() + config.DB_READ_YOUR_WRITES_SECONDS
+        response.set_cookie(
+            READ_PRIMARY_COOKIE,
+            f"{until:.3f}",
+            max_age=math.ceil(config.DB_READ_YOUR_WRITES_SECONDS),
+            httponly=True,
+            samesite="lax",
+        )
+
+    async with async_session() as session:
+        event.listen(session.sync_session, "after_commit", wrote)
+        yield session
+
+
+async def get_read_session(request: Request) -> AsyncSession:
+    """A session for read-only handlers, using a read replica if any
+
+    Reads go to the primary when the request has the header
+    "X-Read-Primary: true" or the cookie set when a write of the client was
+    committed in the last DB_READ_YOUR_WRITES_SECONDS, so a client keeping
+    cookies sees its own writes. A replica that cannot be connected to is skipped for
+    DB_REPLICA_RETRY_SECONDS and the next one (or the primary) is used.
+    """
+
+    use_primary = reads_from_primary(request)
+
+    if replica_sessions and not use_primary:
+        for index in _replica_order():
+            async with replica_sessions[index]() as session:
+                try:
+                    await session.connection()
+                except (SQLAlchemyError, OSError):
+                    _replica_down_until[index] = (
+                        time.monotonic() + config.DB_REPLICA_RETRY_SECONDS
+                    )
+                    continue
+
+                yield session
+                return
 
-async def get_session() -> AsyncSession:
-    async_session = sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False
-    )
     async with async_session() as session:
         yield session
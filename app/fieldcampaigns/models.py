@@ -4,6 +4,7 @@ from typing import Any
 from typing import TYPE_CHECKING
 import datetime
 from app.sites.models import SiteRead, Site
+from app.utils import trigram_index
 
 
 class FieldCampaignBase(SQLModel):
@@ -12,7 +13,11 @@ class FieldCampaignBase(SQLModel):
 
 
 class FieldCampaign(FieldCampaignBase, table=True):
-    __table_args__ = (UniqueConstraint("id"),)
+    __table_args__ = (
+        UniqueConstraint("id"),
+        trigram_index("fieldcampaign", "name"),
+        trigram_index("fieldcampaign", "description"),
+    )
     iterator: int = Field(
         default=None,
         nullable=False,
@@ -32,7 +37,7 @@ class FieldCampaign(FieldCampaignBase, table=True):
 
     sites: list[Site] = Relationship(
         back_populates="field_campaign",
-        sa_relationship_kwargs={"lazy": "selectin"},
+        sa_relationship_kwargs={"lazy": "raise", "passive_deletes": True},
     )
 
 
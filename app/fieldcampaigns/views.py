@@ -1,22 +1,35 @@
 from fastapi import Depends, APIRouter, Query, Response, Body, HTTPException
 from sqlmodel import select
-from app.db import get_session, AsyncSession
+from sqlalchemy import update
+from app.sites.models import Site
+from app.db import get_session, get_read_session, AsyncSession
 from app.fieldcampaigns.models import (
     FieldCampaign,
     FieldCampaignCreate,
     FieldCampaignRead,
     FieldCampaignUpdate,
 )
+from app.query import ListQuery, list_response, filter_params
+from app.config import config
+from app.cache import data_changed
 from uuid import UUID
-from sqlalchemy import func
-import json
 
 router = APIRouter()
 
+field_campaign_list_query = ListQuery(
+    FieldCampaign,
+    resource="field_campaigns",
+    filter_fields=["id", "name", "description"],
+    exact_fields=["id"],
+    sort_fields=["id", "name", "description", "created_at"],
+    columns=[FieldCampaign.id, FieldCampaign.name, FieldCampaign.description],
+    search_fields=["name", "description"],
+)
+
 
 @router.get("/{field_campaign_id}", response_model=FieldCampaignRead)
 async def get_field_campaign(
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
     *,
     field_campaign_id: UUID,
 ) -> FieldCampaignRead:
@@ -35,68 +48,36 @@ async def get_field_campaigns(
     filter: str = Query(None),
     sort: str = Query(None),
     range: str = Query(None),
-    session: AsyncSession = Depends(get_session),
+    cursor: str = Query(None),
+    q: str = Query(None),
+    session: AsyncSession = Depends(get_read_session),
 ):
     """Get all field campaigns"""
 
-    sort = json.loads(sort) if sort else []
-    range = json.loads(range) if range else []
-    filter = json.loads(filter) if filter else {}
-
-    query = select(FieldCampaign)
-
-    # Do a query to satisfy total count for "Content-Range" header
-    count_query = select(func.count(FieldCampaign.iterator))
-    if len(filter):  # Have to filter twice for some reason? SQLModel state?
-        for field, value in filter.items():
-            for qry in [query, count_query]:  # Apply filter to both queries
-                if isinstance(value, list):
-                    qry = qry.where(getattr(FieldCampaign, field).in_(value))
-                elif field == "id" or field == "field_campaign_id":
-                    qry = qry.where(getattr(FieldCampaign, field) == value)
-                else:
-                    qry = qry.where(
-                        getattr(FieldCampaign, field).like(f"%{value}%")
-                    )
-
-    # Execute total count query (including filter)
-    total_count_query = await session.execute(count_query)
-    total_count = total_count_query.scalar_one()
-
-    # Order by sort field params ie. ["name","ASC"]
-    if len(sort) == 2:
-        sort_field, sort_order = sort
-        if sort_order == "ASC":
-            query = query.order_by(getattr(FieldCampaign, sort_field))
-        else:
-            query = query.order_by(getattr(FieldCampaign, sort_field).desc())
-
-    # Filter by filter field params ie. {"name":"bar"}
-    if len(filter):
-        for field, value in filter.items():
-            if isinstance(value, list):
-                query = query.where(getattr(FieldCampaign, field).in_(value))
-            elif field == "id" or field == "field_campaign_id":
-                query = query.where(getattr(FieldCampaign, field) == value)
-            else:
-                query = query.where(
-                    getattr(FieldCampaign, field).like(f"%{value}%")
-                )
-
-    if len(range) == 2:
-        start, end = range
-        query = query.offset(start).limit(end - start + 1)
-    else:
-        start, end = [0, total_count]  # For content-range header
-
-    # Execute query
-    results = await session.execute(query)
-    field_campaigns = results.scalars().all()
-
-    response.headers[
-        "Content-Range"
-    ] = f"field_campaigns {start}-{end}/{total_count}"
-    return field_campaigns
+    if config.FAST_LIST_RESPONSES:
+        return list_response(
+            response,
+            await field_campaign_list_query.paginate(
+                session,
+                response,
+                filter=filter,
+                sort=sort,
+                range=range,
+                cursor=cursor,
+                query_filter=filter_params(q),
+                as_rows=True,
+            ),
+        )
+
+    return await field_campaign_list_query.paginate(
+        session,
+        response,
+        filter=filter,
+        sort=sort,
+        range=range,
+        cursor=cursor,
+        query_filter=filter_params(q),
+    )
 
 
 @router.post("", response_model=FieldCampaignRead)
@@ -109,6 +90,7 @@ async def create_field_campaign(
     field_campaign = FieldCampaign.from_orm(field_campaign)
     session.add(field_campaign)
     await session.commit()
+    data_changed(FieldCampaign)
     await session.refresh(field_campaign)
 
     return field_campaign
@@ -136,6 +118,7 @@ async def update_field_campaign(
 
     session.add(field_campaign_db)
     await session.commit()
+    data_changed(FieldCampaign)
     await session.refresh(field_campaign_db)
 
     return field_campaign_db
@@ -154,5 +137,12 @@ async def delete_field_campaign(
     field_campaign = res.scalars().one_or_none()
 
     if field_campaign:
+        # Keep the sites of the campaign, as the ORM cascade used to
+        await session.execute(
+            update(Site)
+            .where(Site.field_campaign_id == field_campaign_id)
+            .values(field_campaign_id=None)
+        )
         await session.delete(field_campaign)
         await session.commit()
+        data_changed(FieldCampaign, Site)
@@ -0,0 +1,216 @@
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any
+import datetime
+import hashlib
+import orjson
+import zlib
+
+# Cache-Control of responses that must be revalidated with their ETag, as
+# records can be updated
+REVALIDATE = "no-cache"
+
+
+def etag(*parts: Any) -> str:
+    """A strong entity tag derived from the given values"""
+
+    digest = hashlib.blake2b(
+        orjson.dumps(parts, default=str), digest_size=16
+    ).hexdigest()
+
+    return f'"{digest}"'
+
+
+def cache_headers(
+    etag: str,
+    last_modified: datetime.datetime | None = None,
+    cache_control: str = REVALIDATE,
+) -> dict[str, str]:
+    """The validator and Cache-Control headers of a response
+
+    Naive datetimes are taken as UTC, as the created_at of all records.
+    """
+
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=datetime.timezone.utc)
+        headers["Last-Modified"] = format_datetime(
+            last_modified.replace(microsecond=0), usegmt=True
+        )
+
+    return headers
+
+
+def not_modified(
+    request: Request,
+    headers: dict[str, str],
+) -> bool:
+    """Whether the client already has the response with these headers
+
+    As in RFC 9110, If-Modified-Since is only used without If-None-Match.
+    """
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip() for tag in if_none_match.split(",")}
+        tags = {tag[2:] if tag.startswith("W/") else tag for tag in tags}
+
+        return "*" in tags or headers["ETag"] in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and "Last-Modified" in headers:
+        try:
+            return parsedate_to_datetime(
+                headers["Last-Modified"]
+            ) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False  # Invalid dates are ignored
+
+    return False
+
+
+def accepts_encoding(
+    request: Request,
+    encoding: str,
+) -> bool:
+    """Whether the Accept-Encoding of the request allows a content coding
+
+    A coding with a q value of 0 is refused, and * covers the codings that
+    are not listed.
+    """
+
+    qualities = {}
+    for item in request.headers.get("accept-encoding", "").split(","):
+        coding, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+
+    return qualities.get(encoding, qualities.get("*", 0.0)) > 0
+
+
+def vary_encoding(
+    request: Request,
+    headers: dict[str, str],
+) -> dict[str, str]:
+    """The cache headers of a response that is sent gzip compressed to the
+    clients accepting gzip, by NegotiatedGZipMiddleware or as stored
+
+    The two encodings are different representations, so clients accepting
+    gzip get the ETag with a "-gzip" suffix (also when their response is
+    too small to be compressed, as it is then always the same), and Vary
+    keeps them apart in caches. The headers are those of the 304 responses
+    too.
+    """
+
+    headers = {**headers, "Vary": "Accept-Encoding"}
+    if accepts_encoding(request, "gzip"):
+        headers["ETag"] = headers["ETag"][:-1] + '-gzip"'
+
+    return headers
+
+
+class NegotiatedGZipMiddleware:
+    """Compress the responses of the clients accepting gzip (as in
+    accepts_encoding, so that gzip;q=0 is honoured)
+
+    As Starlette's GZipMiddleware, responses smaller than minimum_size and
+    those that already have a Content-Encoding, such as the stored LICOR
+    files, are sent as they are. The compression runs in the thread pool,
+    so that multi-MB responses do not block the event loop.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 500,
+        compresslevel: int = 9,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+    ) -> None:
+        if scope["type"] != "http" or not accepts_encoding(
+            Request(scope), "gzip"
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        start: Message = {}
+        compressor = None
+        passthrough = False
+
+        async def send_gzip(message: Message) -> None:
+            nonlocal start, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start["headers"])
+                if "content-encoding" in headers or (
+                    len(body) < self.minimum_size and not more_body
+                ):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                headers["Content-Encoding"] = "gzip"
+                if "accept-encoding" not in headers.get("vary", "").lower():
+                    headers.add_vary_header("Accept-Encoding")
+                compressor = zlib.compressobj(
+                    self.compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+                )
+                body = await run_in_threadpool(
+                    gzip_chunk, compressor, body, more_body
+                )
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+            else:
+                body = await run_in_threadpool(
+                    gzip_chunk, compressor, body, more_body
+                )
+
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_gzip)
+
+
+def gzip_chunk(
+    compressor: Any,
+    body: bytes,
+    more_body: bool,
+) -> bytes:
+    """Compress a chunk of a response, ending the gzip stream on the last"""
+
+    data = compressor.compress(body)
+    if not more_body:
+        data += compressor.flush()
+
+    return data
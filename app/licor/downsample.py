@@ -0,0 +1,219 @@
+from typing import Any, Literal
+import numpy as np
+import math
+
+Aggregation = Literal["mean", "min", "max", "lttb"]
+
+# The key of the tables of measurements of a LICOR dataset, such as
+# reps/0/data. The other lists of a dataset are metadata.
+DATA_TABLE_KEY = "data"
+
+
+def downsample(
+    measurements: Any,
+    max_points: int | None = None,
+    bucket: int | None = None,
+    agg: Aggregation = "mean",
+    key: Any = None,
+) -> Any:
+    """Reduce the series of a LICOR dataset, keeping its structure
+
+    In the dicts under a DATA_TABLE_KEY key, the lists of scalars of the
+    same length are the columns of one table, and are reduced together so
+    that their rows stay aligned. Tables are reduced to max_points rows, or
+    by buckets of `bucket` rows. The lists of the metadata are kept.
+    """
+
+    if isinstance(measurements, list):
+        return [
+            downsample(item, max_points, bucket, agg, index)
+            for index, item in enumerate(measurements)
+        ]
+
+    if not isinstance(measurements, dict):
+        return measurements
+
+    tables: dict[int, list[str]] = {}
+    reduced = {}
+    for name, value in measurements.items():
+        if key == DATA_TABLE_KEY and is_series(value):
+            tables.setdefault(len(value), []).append(name)
+        elif is_series(value):
+            reduced[name] = value
+        else:
+            reduced[name] = downsample(value, max_points, bucket, agg, name)
+
+    for length, names in tables.items():
+        columns = reduce_table(
+            [measurements[name] for name in names], max_points, bucket, agg
+        )
+        reduced.update(zip(names, columns))
+
+    # Keep the order of the keys of the original file
+    return {name: reduced[name] for name in measurements}
+
+
+def is_series(
+    value: Any,
+) -> bool:
+    """Whether a value of a LICOR dataset is a list of scalar values"""
+
+    return isinstance(value, list) and all(
+        not isinstance(item, (list, dict)) for item in value
+    )
+
+
+def reduce_table(
+    columns: list[list],
+    max_points: int | None,
+    bucket: int | None,
+    agg: Aggregation,
+) -> list[list]:
+    """Reduce the aligned columns of a table"""
+
+    length = len(columns[0])
+    arrays = [numeric_array(column) for column in columns]
+
+    if agg == "lttb":
+        # LTTB keeps the first and last rows and one row per bucket between
+        points = max(max_points or math.ceil(length / bucket), 3)
+        if points >= length:
+            return columns
+
+        numeric = [array for array in arrays if array is not None]
+        indices = (
+            lttb_indices(np.column_stack(numeric), points)
+            if numeric
+            else np.linspace(0, length - 1, points).astype(int)
+        )
+
+        return [
+            (
+                to_list(array[indices])
+                if array is not None
+                else [column[i] for i in indices]
+            )
+            for column, array in zip(columns, arrays)
+        ]
+
+    size = bucket or math.ceil(length / max_points)
+    if size <= 1:
+        return columns
+
+    starts = np.arange(0, length, size)
+
+    # Columns that are not numeric keep the first value of each bucket
+    return [
+        (
+            to_list(aggregate(array, starts, agg))
+            if array is not None
+            else [column[i] for i in starts]
+        )
+        for column, array in zip(columns, arrays)
+    ]
+
+
+def numeric_array(
+    column: list,
+) -> np.ndarray | None:
+    """The column as a NumPy array, with NaN for missing values, or None if
+    it is not numeric"""
+
+    array = np.asarray(column)
+    if array.dtype.kind in "iuf":
+        return array
+
+    if array.dtype.kind == "O" and all(
+        value is None
+        or (isinstance(value, (int, float)) and not isinstance(value, bool))
+        for value in column
+    ):
+        return array.astype(float)  # None becomes NaN
+
+    return None
+
+
+def aggregate(
+    array: np.ndarray,
+    starts: np.ndarray,
+    agg: Aggregation,
+) -> np.ndarray:
+    """Aggregate the buckets starting at the given indices, ignoring NaN"""
+
+    if agg == "min":
+        return np.fmin.reduceat(array, starts)
+    if agg == "max":
+        return np.fmax.reduceat(array, starts)
+
+    missing = np.isnan(array) if array.dtype.kind == "f" else None
+    if missing is None:
+        sums = np.add.reduceat(array, starts, dtype=float)
+        counts = np.diff(np.append(starts, len(array)))
+    else:
+        sums = np.add.reduceat(np.where(missing, 0, array), starts)
+        counts = np.add.reduceat(~missing, starts)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts  # NaN for buckets without values
+
+
+def lttb_indices(
+    values: np.ndarray,
+    points: int,
+) -> np.ndarray:
+    """Select the rows to keep with the Largest-Triangle-Three-Buckets
+    algorithm, over all the columns of values scaled to their range
+
+    The rows are taken as evenly spaced, as LICOR measurements are. points
+    must be at least 3 and less than the number of rows, so that no bucket
+    is empty.
+    """
+
+    length = len(values)
+
+    low = np.fmin.reduce(values, axis=0)
+    span = np.fmax.reduce(values, axis=0) - low
+    values = np.nan_to_num((values - low) / np.where(span > 0, span, 1))
+    x = np.arange(length, dtype=float)
+
+    # The first and last rows are kept and the others split in buckets
+    edges = np.linspace(1, length - 1, points - 1).astype(int)
+    indices = np.empty(points, dtype=int)
+    indices[0] = 0
+    indices[-1] = length - 1
+
+    selected = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end : edges[i + 2]].mean()
+            next_values = values[end : edges[i + 2]].mean(axis=0)
+        else:
+            next_x = x[-1]
+            next_values = values[-1]
+
+        # Twice the area of the triangles with the selected row of the
+        # previous bucket and the average of the next one
+        area = np.abs(
+            (x[selected] - next_x) * (values[start:end] - values[selected])
+            - (x[selected] - x[start:end, None])
+            * (next_values - values[selected])
+        ).sum(axis=1)
+
+        selected = start + int(np.argmax(area))
+        indices[i + 1] = selected
+
+    return indices
+
+
+def to_list(
+    array: np.ndarray,
+) -> list:
+    """The array as a list for JSON, with None for NaN"""
+
+    if array.dtype.kind == "f" and np.isnan(array).any():
+        return [
+            None if math.isnan(value) else value for value in array.tolist()
+        ]
+
+    return array.tolist()
@@ -0,0 +1,323 @@
+from sqlalchemy.ext.asyncio import AsyncResult
+from app.licor.downsample import DATA_TABLE_KEY, is_series, numeric_array
+from typing import Any, AsyncIterator, Iterable, Iterator, Literal
+import numpy as np
+import csv
+import io
+import math
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional, only needed for Arrow and Parquet exports
+    pa = None
+
+ExportFormat = Literal["csv", "arrow", "parquet"]
+
+# Media type and file extension of each export format
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Columns of every exported row, followed by one column per variable of the
+# exported tables
+EXPORT_COLUMNS = [
+    "licor_id",
+    "dataset",
+    "table",  # Path of the table in the dataset, such as reps/0/data
+    "row",
+]
+
+# Rows buffered into each row group of Parquet exports
+PARQUET_ROW_GROUP_SIZE = 64 * 1024
+
+
+def export_variables(
+    manifests: Iterable[tuple[list[str], dict[str, Any]]],
+) -> dict[str, bool]:
+    """The variables of the exported tables and whether each is numeric
+
+    Exports are in wide format, with one column per variable, so the columns
+    of a file are the union of the variables listed by the manifests (the
+    columns and ranges of LICORDatasetData) of its datasets, in order. A
+    variable is numeric if a dataset has a range for it. Variables named as
+    one of the EXPORT_COLUMNS are left out.
+    """
+
+    variables: dict[str, bool] = {}
+    for columns, ranges in manifests:
+        for name in columns:
+            if name not in EXPORT_COLUMNS:
+                variables[name] = variables.get(name, False) or name in ranges
+
+    return variables
+
+
+def iter_tables(
+    measurements: Any,
+    path: tuple = (),
+) -> Iterator[tuple[str, dict[str, list]]]:
+    """The path and columns of each table of a LICOR dataset
+
+    As in app.licor.downsample, the lists of scalars of the same length in a
+    dict are the columns of one table.
+    """
+
+    if isinstance(measurements, list):
+        for index, item in enumerate(measurements):
+            yield from iter_tables(item, path + (index,))
+
+    elif isinstance(measurements, dict):
+        tables: dict[int, dict[str, list]] = {}
+        for key, value in measurements.items():
+            if is_series(value):
+                tables.setdefault(len(value), {})[key] = value
+            else:
+                yield from iter_tables(value, path + (key,))
+
+        for columns in tables.values():
+            yield "/".join(str(part) for part in path), columns
+
+
+def table_batch(
+    licor_id: str,
+    dataset: str,
+    table: str,
+    columns: dict[str, list],
+) -> dict[str, Any]:
+    """The export columns of a table, one row per row of the table
+
+    Numeric variables are NumPy arrays, with NaN for missing values, and
+    the others lists of strings or None.
+    """
+
+    length = len(next(iter(columns.values())))
+    batch: dict[str, Any] = {}
+    for name, column in columns.items():
+        array = numeric_array(column)
+        if array is None:
+            array = [None if value is None else str(value) for value in column]
+        else:
+            array = array.astype(float)
+        batch[name] = array
+
+    return {
+        **batch,
+        "licor_id": [licor_id] * length,
+        "dataset": [dataset] * length,
+        "table": [table] * length,
+        "row": np.arange(length),
+    }
+
+
+async def export_batches(
+    result: AsyncResult,
+) -> AsyncIterator[dict[str, Any]]:
+    """The export columns of the data tables of streamed datasets
+
+    The rows of the result are the id of a licor record, and the key and
+    measurements of one of its datasets. As for the manifests, only the
+    tables under a DATA_TABLE_KEY key are exported.
+    """
+
+    async for licor_id, dataset, measurements in result:
+        for table, columns in iter_tables(measurements):
+            if table.split("/")[-1] != DATA_TABLE_KEY:
+                continue
+            if columns and len(next(iter(columns.values()))):
+                yield table_batch(str(licor_id), dataset, table, columns)
+
+
+def csv_value(
+    value: Any,
+) -> Any:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+
+    return value
+
+
+async def csv_chunks(
+    batches: AsyncIterator[dict[str, Any]],
+    variables: dict[str, bool],
+) -> AsyncIterator[bytes]:
+    columns = EXPORT_COLUMNS + list(variables)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+
+    async for batch in batches:
+        length = len(batch["row"])
+        values = [
+            (
+                batch[column].tolist()
+                if isinstance(batch.get(column), np.ndarray)
+                else batch.get(column, [None] * length)
+            )
+            for column in columns
+        ]
+        writer.writerows(
+            [csv_value(value) for value in row] for row in zip(*values)
+        )
+
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    yield buffer.getvalue().encode()
+
+
+class ChunkSink:
+    """A write-only file that hands over what was written in chunks, so that
+    Arrow writers can be streamed"""
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def writable(self) -> bool:
+        return True
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+
+        return data
+
+
+def arrow_schema(
+    variables: dict[str, bool],
+) -> "pa.Schema":
+    return pa.schema(
+        [
+            ("licor_id", pa.string()),
+            ("dataset", pa.string()),
+            ("table", pa.string()),
+            ("row", pa.int64()),
+        ]
+        + [
+            (name, pa.float64() if numeric else pa.string())
+            for name, numeric in variables.items()
+        ]
+    )
+
+
+def float_or_nan(
+    value: str | None,
+) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def arrow_column(
+    values: Any,
+    length: int,
+    type: "pa.DataType",
+) -> "pa.Array":
+    """An Arrow column of a batch, converting the values of a variable that
+    is numeric in some datasets and text in others"""
+
+    if values is None:
+        return pa.nulls(length, type)
+
+    if type == pa.float64() and not isinstance(values, np.ndarray):
+        values = np.array([float_or_nan(value) for value in values])
+    elif type == pa.string() and isinstance(values, np.ndarray):
+        values = [
+            None if math.isnan(value) else str(value)
+            for value in values.tolist()
+        ]
+
+    return pa.array(values, type=type, from_pandas=True)
+
+
+def arrow_batch(
+    batch: dict[str, Any],
+    schema: "pa.Schema",
+) -> "pa.RecordBatch":
+    length = len(batch["row"])
+
+    return pa.record_batch(
+        [
+            arrow_column(batch.get(field.name), length, field.type)
+            for field in schema
+        ],
+        schema=schema,
+    )
+
+
+async def arrow_chunks(
+    batches: AsyncIterator[dict[str, Any]],
+    variables: dict[str, bool],
+) -> AsyncIterator[bytes]:
+    """An Arrow IPC stream, with one record batch per table"""
+
+    schema = arrow_schema(variables)
+    sink = ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        async for batch in batches:
+            writer.write_batch(arrow_batch(batch, schema))
+            yield sink.take()
+
+    yield sink.take()
+
+
+async def parquet_chunks(
+    batches: AsyncIterator[dict[str, Any]],
+    variables: dict[str, bool],
+) -> AsyncIterator[bytes]:
+    """A Parquet file, with the tables buffered into row groups of
+    PARQUET_ROW_GROUP_SIZE rows"""
+
+    schema = arrow_schema(variables)
+    sink = ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        buffered: list["pa.RecordBatch"] = []
+        rows = 0
+        async for batch in batches:
+            buffered.append(arrow_batch(batch, schema))
+            rows += buffered[-1].num_rows
+            if rows >= PARQUET_ROW_GROUP_SIZE:
+                writer.write_table(
+                    pa.Table.from_batches(buffered, schema),
+                    row_group_size=PARQUET_ROW_GROUP_SIZE,
+                )
+                buffered.clear()
+                rows = 0
+                yield sink.take()
+
+        if buffered:
+            writer.write_table(
+                pa.Table.from_batches(buffered, schema),
+                row_group_size=PARQUET_ROW_GROUP_SIZE,
+            )
+
+    yield sink.take()
+
+
+EXPORT_WRITERS = {
+    "csv": csv_chunks,
+    "arrow": arrow_chunks,
+    "parquet": parquet_chunks,
+}
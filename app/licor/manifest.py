@@ -0,0 +1,56 @@
+from app.licor.downsample import DATA_TABLE_KEY, numeric_array
+from app.licor.export import iter_tables
+from typing import Any
+import numpy as np
+
+# The variable that times the rows of LICOR tables, in seconds
+TIME_VARIABLE = "SECONDS"
+
+
+def dataset_manifest(
+    measurements: Any,
+) -> dict[str, Any]:
+    """Summarize a LICOR dataset without its series
+
+    The manifest holds the number of rows of its data tables (those under a
+    DATA_TABLE_KEY key), the names of their variables in order, the min and
+    max of each numeric variable and the time span of the rows (the range
+    of SECONDS), with the fields of LICORDatasetData. The lists of the
+    metadata are left out.
+    """
+
+    row_count = 0
+    columns: dict[str, None] = {}  # Ordered set of the variable names
+    ranges: dict[str, dict[str, float]] = {}
+
+    for path, table in iter_tables(measurements):
+        if path.split("/")[-1] != DATA_TABLE_KEY:
+            continue
+
+        row_count += len(next(iter(table.values())))
+
+        for name, column in table.items():
+            columns.setdefault(name)
+            array = numeric_array(column)
+            if array is None or not len(array):
+                continue
+
+            array = array[np.isfinite(array)]
+            if not len(array):
+                continue
+
+            low, high = float(array.min()), float(array.max())
+            if name in ranges:
+                low = min(low, ranges[name]["min"])
+                high = max(high, ranges[name]["max"])
+            ranges[name] = {"min": low, "max": high}
+
+    time_range = ranges.get(TIME_VARIABLE, {})
+
+    return {
+        "row_count": row_count,
+        "columns": list(columns),
+        "ranges": ranges,
+        "time_start": time_range.get("min"),
+        "time_end": time_range.get("max"),
+    }
@@ -2,8 +2,11 @@ from sqlmodel import SQLModel, Field, UniqueConstraint, Relationship
 from uuid import uuid4, UUID
 from typing import Any
 import datetime
-from sqlalchemy import JSON, Column
+from sqlalchemy import Column, ForeignKey, Index, LargeBinary
+from sqlalchemy.orm import deferred
+from sqlmodel.sql.sqltypes import GUID
 from typing import TYPE_CHECKING
+from app.utils import trigram_index, jsonb_path_index, JSONVariant
 
 if TYPE_CHECKING:
     from app.sites.models import Site
@@ -26,7 +29,14 @@ class LICORDataBase(SQLModel):
 
 
 class LICORData(LICORDataBase, table=True):
-    __table_args__ = (UniqueConstraint("id"),)
+    __table_args__ = (
+        UniqueConstraint("id"),
+        Index("ix_licordata_site_id_recorded_at", "site_id", "recorded_at"),
+        trigram_index("licordata", "name"),
+        trigram_index("licordata", "description"),
+        # The metadata of the files, as filtered by app.licor.views
+        jsonb_path_index("ix_licordata_metadata", "(data - 'datasets')"),
+    )
     iterator: int = Field(
         default=None,
         nullable=False,
@@ -44,12 +54,81 @@ class LICORData(LICORDataBase, table=True):
         nullable=False,
         index=True,
     )
-    data: dict = Field(default={}, sa_column=Column(JSON))
+    data: dict = Field(
+        default={},
+        title="The metadata of the uploaded file, without its datasets",
+        sa_column=Column(JSONVariant()),
+    )
+    data_compressed: bytes | None = Field(
+        default=None,
+        title="The uploaded file as sent, gzip compressed",
+        sa_column=Column(LargeBinary, nullable=True),
+    )
     site: "Site" = Relationship(
-        back_populates="licordata", sa_relationship_kwargs={"lazy": "selectin"}
+        back_populates="licordata", sa_relationship_kwargs={"lazy": "raise"}
     )
 
 
+# The uploaded file can be several MB, so it and its metadata are only
+# loaded when selected explicitly, as in select(LICORData.data), and raise
+# like the lazy="raise" relationships if read otherwise
+LICORData.__mapper__.add_property(
+    "data", deferred(LICORData.__table__.c.data, raiseload=True)
+)
+LICORData.__mapper__.add_property(
+    "data_compressed",
+    deferred(LICORData.__table__.c.data_compressed, raiseload=True),
+)
+
+
+class LICORDatasetData(SQLModel, table=True):
+    """One dataset of a LICOR record, split out of the uploaded file so that
+    a single dataset can be read without decoding the whole document"""
+
+    __table_args__ = (
+        UniqueConstraint("id"),
+        UniqueConstraint("licor_id", "key"),
+    )
+    iterator: int = Field(
+        default=None,
+        nullable=False,
+        primary_key=True,
+        index=True,
+    )
+    id: UUID = Field(
+        default_factory=uuid4,
+        index=True,
+        nullable=False,
+    )
+    licor_id: UUID = Field(
+        sa_column=Column(
+            GUID(),
+            ForeignKey("licordata.id", ondelete="CASCADE"),
+            nullable=False,
+            index=True,
+        )
+    )
+    key: str = Field(nullable=False, index=True)
+    position: int = Field(
+        title="The order of the dataset in the original file",
+        default=0,
+        nullable=False,
+    )
+    measurements: dict = Field(default={}, sa_column=Column(JSONVariant()))
+
+    # Manifest of the dataset, computed when it is added (see
+    # app.licor.manifest) so that it can be listed without its series
+    row_count: int = Field(default=0, nullable=False)
+    columns: list[str] = Field(default=[], sa_column=Column(JSONVariant()))
+    ranges: dict[str, dict[str, float]] = Field(
+        title="The min and max of each numeric variable",
+        default={},
+        sa_column=Column(JSONVariant()),
+    )
+    time_start: float | None = Field(default=None, nullable=True)
+    time_end: float | None = Field(default=None, nullable=True)
+
+
 class LICORDataRead(LICORDataBase):
     id: UUID
     created_at: datetime.datetime
@@ -70,3 +149,13 @@ class LICORDataUpdate(LICORDataBase):
 class LICORDataset(SQLModel):
     key: str
     measurements: dict[str, Any]
+
+
+class LICORDatasetManifest(SQLModel):
+    key: str
+    position: int
+    row_count: int
+    columns: list[str]
+    ranges: dict[str, dict[str, float]]
+    time_start: float | None  # Range of the SECONDS of the rows
+    time_end: float | None
@@ -1,27 +1,333 @@
-from fastapi import Depends, APIRouter, Query, Response, Body, HTTPException
+from fastapi import (
+    Depends,
+    APIRouter,
+    Query,
+    Response,
+    Body,
+    HTTPException,
+    Request,
+)
 from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlmodel import select
-from app.db import get_session, AsyncSession
+from app.db import get_session, get_read_session, AsyncSession
 from app.licor.models import (
     LICORData,
     LICORDataCreate,
     LICORDataRead,
     LICORDataUpdate,
     LICORDataset,
+    LICORDatasetData,
+    LICORDatasetManifest,
     LICORDataReadWithMeasurements,
 )
+from app.query import (
+    ListQuery,
+    TimelineInterval,
+    list_response,
+    filter_params,
+)
+from app.config import config
+from app.cache import Cache, data_changed
+from app.http_cache import (
+    etag,
+    cache_headers,
+    not_modified,
+    accepts_encoding,
+    vary_encoding,
+)
+from app.models.timeline import TimelineCount
 from uuid import UUID
-from sqlalchemy import func
-from app.utils import decode_base64
+from typing import Any
+from app.utils import decode_base64, json_without
+from app.licor.downsample import downsample, Aggregation
+from app.licor.manifest import dataset_manifest
+from app.licor.export import (
+    ExportFormat,
+    EXPORT_FORMATS,
+    EXPORT_WRITERS,
+    export_batches,
+    export_variables,
+    pa,
+)
 import orjson
 import datetime
+import gzip
 
 router = APIRouter()
 
+# The uploaded file without its datasets, extracted in the database
+licor_metadata = json_without(LICORData.data, "datasets")
+
+licor_list_query = ListQuery(
+    LICORData,
+    resource="licors",
+    filter_fields=["id", "name", "description", "site_id", "recorded_at"],
+    exact_fields=["id", "site_id"],
+    sort_fields=[
+        "id",
+        "name",
+        "description",
+        "site_id",
+        "recorded_at",
+        "created_at",
+    ],
+    columns=[
+        LICORData.id,
+        LICORData.name,
+        LICORData.description,
+        LICORData.site_id,
+        LICORData.recorded_at,
+        LICORData.created_at,
+    ],
+    search_fields=["name", "description"],
+    range_fields=["recorded_at", "created_at"],
+    json_fields={"metadata": licor_metadata},
+)
+
+# Files up to this size have their datasets cached when they are uploaded,
+# as measuring larger ones would cost another copy of the file in memory
+UPLOAD_CACHE_MAX_SIZE = 4 * 1024 * 1024
+
+# Creation time, measurements and size in bytes of each dataset, by record
+# and dataset key. Cached datasets are served without reading the record,
+# so the entries of a record are popped when it is updated or deleted, and
+# expire after the TTL in the other workers.
+dataset_cache = Cache(
+    max_size=config.LICOR_DATASET_CACHE_MAX_BYTES,
+    ttl=config.LICOR_DATASET_CACHE_TTL_SECONDS,
+    sizeof=lambda entry: entry[2],
+    group=lambda key: key[0],
+)
+
+# Downsampled datasets and their size in bytes, by record, creation time,
+# dataset and downsampling parameters
+downsample_cache = Cache(
+    max_size=config.LICOR_DOWNSAMPLE_CACHE_MAX_BYTES,
+    ttl=config.LICOR_DATASET_CACHE_TTL_SECONDS,
+    sizeof=lambda entry: entry[1],
+    group=lambda key: key[0],
+)
+
+
+def split_datasets(
+    licor_id: UUID,
+    data: dict,
+) -> list[LICORDatasetData]:
+    """Split the datasets of a LICOR file into one row per dataset key
+
+    If a key is repeated in the file, the first occurrence is kept, as this
+    is the one that was previously returned by the dataset endpoint. The
+    manifest of each dataset is computed here, once.
+    """
+
+    datasets = {}
+    for position, dataset in enumerate(data.get("datasets", [])):
+        for key, measurements in dataset.items():
+            if key not in datasets:
+                datasets[key] = LICORDatasetData(
+                    licor_id=licor_id,
+                    key=key,
+                    position=position,
+                    measurements=measurements,
+                    **dataset_manifest(measurements),
+                )
+
+    return list(datasets.values())
+
+
+def licor_data_cache_headers(
+    request: Request,
+    licor_id: UUID,
+    created_at: datetime.datetime,
+    *parts: Any,
+) -> dict[str, str]:
+    """Cache headers of the file and datasets of a licor record
+
+    These never change after upload, so they are validated by the id and
+    creation time of the record alone, and cached as immutable.
+    """
+
+    return vary_encoding(
+        request,
+        cache_headers(
+            etag(licor_id, created_at, *parts),
+            last_modified=created_at,
+            cache_control=(
+                f"public, max-age={config.LICOR_DATA_MAX_AGE_SECONDS}, "
+                "immutable"
+            ),
+        ),
+    )
+
+
+async def get_licor_created_at(
+    session: AsyncSession,
+    licor_id: UUID,
+) -> datetime.datetime:
+    """Get the creation time of a licor record, without loading its data"""
+
+    res = await session.execute(
+        select(LICORData.created_at).where(LICORData.id == licor_id)
+    )
+    created_at = res.scalars().one_or_none()
+
+    if created_at is None:
+        raise HTTPException(status_code=404, detail="LICORData not found")
+
+    return created_at
+
+
+def cache_datasets(
+    licor_id: UUID,
+    created_at: datetime.datetime,
+    datasets: dict[str, Any],
+) -> None:
+    """Add the datasets of a licor record to the dataset cache"""
+
+    for key, measurements in datasets.items():
+        dataset_cache.set(
+            (licor_id, key),
+            (created_at, measurements, len(orjson.dumps(measurements))),
+        )
+
+
+def evict_datasets(
+    licor_id: UUID,
+) -> None:
+    """Remove the cached datasets of a licor record from this worker"""
+
+    dataset_cache.pop_group(licor_id)
+    downsample_cache.pop_group(licor_id)
+
+
+async def get_datasets(
+    session: AsyncSession,
+    licor_id: UUID,
+    created_at: datetime.datetime,
+) -> dict[str, Any]:
+    """Get the datasets by key of a licor record, and cache each of them"""
+
+    res = await session.execute(
+        select(LICORDatasetData.key, LICORDatasetData.measurements)
+        .where(LICORDatasetData.licor_id == licor_id)
+        .order_by(LICORDatasetData.position, LICORDatasetData.iterator)
+    )
+    datasets = dict(res.all())
+    cache_datasets(licor_id, created_at, datasets)
+
+    return datasets
+
+
+async def get_dataset(
+    session: AsyncSession,
+    licor_id: UUID,
+    created_at: datetime.datetime,
+    key: str,
+) -> Any | None:
+    """Load the measurements of one dataset of a licor record, and cache
+    them"""
+
+    res = await session.execute(
+        select(LICORDatasetData.measurements).where(
+            LICORDatasetData.licor_id == licor_id,
+            LICORDatasetData.key == key,
+        )
+    )
+    measurements = res.scalars().one_or_none()
+    if measurements is not None:
+        cache_datasets(licor_id, created_at, {key: measurements})
+
+    return measurements
+
+
+@router.get("/export")
+async def export_licors(
+    filter: str = Query(None),
+    sort: str = Query(None),
+    format: ExportFormat = Query("csv"),
+    session: AsyncSession = Depends(get_read_session),
+) -> StreamingResponse:
+    """Export the data tables of the licor records matching a filter
+
+    The columns of the file are read first from the manifests of the
+    datasets, then the file is written while the datasets are streamed from
+    the database, see app.licor.export.
+    """
+
+    if format != "csv" and pa is None:
+        raise HTTPException(
+            status_code=501,
+            detail=f"The {format} format needs pyarrow to be installed",
+        )
+
+    params = licor_list_query.parse(filter, sort, None)
+    values = licor_list_query.filter_values(params)
+
+    statement = licor_list_query.where(
+        select(
+            LICORData.id,
+            LICORDatasetData.key,
+            LICORDatasetData.measurements,
+        )
+        .select_from(LICORData)
+        .join(LICORDatasetData, LICORDatasetData.licor_id == LICORData.id),
+        licor_list_query.filter_shape(params),
+    )
+    if len(params.sort) == 2:
+        sort_field, sort_order = params.sort
+        column = getattr(LICORData, sort_field)
+        statement = statement.order_by(
+            column if sort_order == "ASC" else column.desc()
+        )
+    statement = statement.order_by(
+        LICORData.iterator,
+        LICORDatasetData.position,
+        LICORDatasetData.iterator,
+    )
+
+    # The columns of the file, in the order of the datasets
+    res = await session.execute(
+        statement.with_only_columns(
+            LICORDatasetData.columns, LICORDatasetData.ranges
+        ),
+        values,
+    )
+    variables = export_variables(res.all())
+
+    result = await session.stream(statement, values)
+    media_type, extension = EXPORT_FORMATS[format]
+
+    return StreamingResponse(
+        EXPORT_WRITERS[format](export_batches(result), variables),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="licor.{extension}"'
+            )
+        },
+    )
+
+
+@router.get("/timeline", response_model=list[TimelineCount])
+async def get_licor_timeline(
+    filter: str = Query(None),
+    q: str = Query(None),
+    interval: TimelineInterval = Query("day"),
+    session: AsyncSession = Depends(get_read_session),
+) -> list[TimelineCount]:
+    """Count the licor records recorded per site and per day or week"""
+
+    params = licor_list_query.parse(filter, None, None, filter_params(q))
+
+    return await licor_list_query.timeline(session, params, interval)
+
 
 @router.get("/{licor_id}", response_model=LICORDataReadWithMeasurements)
 async def get_licor(
-    session: AsyncSession = Depends(get_session),
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session),
     *,
     licor_id: UUID,
 ) -> LICORDataReadWithMeasurements:
@@ -30,16 +336,34 @@ async def get_licor(
         select(LICORData).where(LICORData.id == licor_id)
     )
     licor = res.scalars().one_or_none()
-    datasets = []
-    for dataset in licor.data["datasets"]:
-        for key, measurements in dataset.items():
-            datasets.append(
-                {
-                    "key": key,
-                    "measurements": measurements,
-                    "licor_id": licor_id,
-                }
-            )
+
+    if not licor:
+        raise HTTPException(status_code=404, detail="LICORData not found")
+
+    # The datasets never change, so the metadata validates the response
+    headers = cache_headers(
+        etag(
+            licor.id,
+            licor.name,
+            licor.description,
+            licor.created_at,
+            licor.recorded_at,
+            licor.site_id,
+        )
+    )
+    if not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+    datasets = await get_datasets(session, licor_id, licor.created_at)
+    datasets = [
+        {
+            "key": key,
+            "measurements": measurements,
+            "licor_id": licor_id,
+        }
+        for key, measurements in datasets.items()
+    ]
 
     obj = LICORDataReadWithMeasurements(
         id=licor.id,
@@ -55,39 +379,187 @@ async def get_licor(
 
 @router.get("/{licor_id}/data")
 async def download_licor_data_as_file(
-    session: AsyncSession = Depends(get_session),
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session),
     *,
     licor_id: UUID,
 ) -> StreamingResponse:
-    """Get a licor record by id and return as the original .json file"""
+    """Get a licor record by id and return as the original .json file
+
+    The file is stored gzip compressed, and sent as stored to clients
+    accepting gzip, or decompressed for the others.
+    """
+
+    headers = licor_data_cache_headers(
+        request, licor_id, await get_licor_created_at(session, licor_id)
+    )
+    if not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
 
     res = await session.execute(
-        select(LICORData).where(LICORData.id == licor_id)
+        select(LICORData.data_compressed).where(LICORData.id == licor_id)
+    )
+    data_compressed = res.scalars().one()
+
+    if data_compressed is None:
+        # Not stored compressed, the file is rebuilt from its metadata and
+        # datasets, and compressed by the middleware
+        response.headers.update(headers)
+        res = await session.execute(
+            select(LICORData.data).where(LICORData.id == licor_id)
+        )
+        metadata = res.scalars().one()
+        res = await session.execute(
+            select(
+                LICORDatasetData.position,
+                LICORDatasetData.key,
+                LICORDatasetData.measurements,
+            )
+            .where(LICORDatasetData.licor_id == licor_id)
+            .order_by(LICORDatasetData.position, LICORDatasetData.iterator)
+        )
+        datasets: list[dict[str, Any]] = []
+        for position, key, measurements in res.all():
+            datasets.extend({} for _ in range(position + 1 - len(datasets)))
+            datasets[position][key] = measurements
+
+        return {**metadata, "datasets": datasets}
+
+    content = data_compressed
+    if accepts_encoding(request, "gzip"):
+        headers["Content-Encoding"] = "gzip"
+    else:
+        content = await run_in_threadpool(gzip.decompress, data_compressed)
+
+    return Response(
+        content=content,
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+@router.get("/{licor_id}/metadata")
+async def get_licor_metadata(
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session),
+    *,
+    licor_id: UUID,
+) -> dict[str, Any]:
+    """Get the uploaded file of a licor record without its datasets"""
+
+    headers = licor_data_cache_headers(
+        request,
+        licor_id,
+        await get_licor_created_at(session, licor_id),
+        "metadata",
+    )
+    if not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+    res = await session.execute(
+        select(licor_metadata).where(LICORData.id == licor_id)
     )
-    licor = res.scalars().one_or_none()
 
-    return licor.data
+    return res.scalars().one()
+
+
+@router.get("/{licor_id}/datasets", response_model=list[LICORDatasetManifest])
+async def get_licor_datasets(
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session),
+    *,
+    licor_id: UUID,
+) -> list[LICORDatasetManifest]:
+    """Get the manifest of the datasets of a licor record, without their
+    measurements"""
+
+    headers = licor_data_cache_headers(
+        request,
+        licor_id,
+        await get_licor_created_at(session, licor_id),
+        "datasets",
+    )
+    if not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+    res = await session.execute(
+        select(
+            LICORDatasetData.key,
+            LICORDatasetData.position,
+            LICORDatasetData.row_count,
+            LICORDatasetData.columns,
+            LICORDatasetData.ranges,
+            LICORDatasetData.time_start,
+            LICORDatasetData.time_end,
+        )
+        .where(LICORDatasetData.licor_id == licor_id)
+        .order_by(LICORDatasetData.position, LICORDatasetData.iterator)
+    )
+
+    return res.all()
 
 
 @router.get("/{licor_id}/dataset/{dataset_id}", response_model=LICORDataset)
 async def get_licor_Dataset(
-    session: AsyncSession = Depends(get_session),
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session),
     *,
     licor_id: UUID,
     dataset_id: str,
+    max_points: int = Query(None, ge=3),
+    bucket: int = Query(None, ge=1),
+    agg: Aggregation = Query("mean"),
 ) -> LICORDataset:
-    """Get a dataset of a licor record"""
+    """Get a dataset of a licor record
+
+    The series of the dataset are downsampled when max_points or bucket is
+    given, by the mean, min or max of each bucket of rows or by selecting
+    rows with LTTB (see app.licor.downsample).
+    """
+
+    # The datasets never change, so a cached one is served without reading
+    # the record
+    cached = dataset_cache.get((licor_id, dataset_id))
+    if cached is not None:
+        created_at, measurements, size = cached
+    else:
+        created_at = await get_licor_created_at(session, licor_id)
 
-    res = await session.execute(
-        select(LICORData).where(LICORData.id == licor_id)
+    downsampling = (max_points, bucket, agg) if max_points or bucket else ()
+    headers = licor_data_cache_headers(
+        request, licor_id, created_at, dataset_id, *downsampling
     )
-    licor = res.scalars().one_or_none()
-    for dataset in licor.data["datasets"]:
-        for key, measurements in dataset.items():
-            if key == dataset_id:
-                return LICORDataset(key=key, measurements=measurements)
-    return
-    # raise HTTPException(status_code=404, detail="Dataset not found")
+    if not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+
+    key = (licor_id, created_at, dataset_id, *downsampling)
+    entry = downsample_cache.get(key) if downsampling else None
+    if entry is not None:
+        measurements, size = entry
+    else:
+        if cached is None:
+            measurements = await get_dataset(
+                session, licor_id, created_at, dataset_id
+            )
+
+        if measurements is None:
+            raise HTTPException(status_code=404, detail="Dataset not found")
+
+        if downsampling:
+            measurements = downsample(measurements, max_points, bucket, agg)
+            downsample_cache.set(
+                key, (measurements, len(orjson.dumps(measurements)))
+            )
+
+    response.headers.update(headers)
+
+    return LICORDataset(key=dataset_id, measurements=measurements)
 
 
 @router.get("", response_model=list[LICORDataRead])
@@ -96,69 +568,91 @@ async def get_licors(
     filter: str = Query(None),
     sort: str = Query(None),
     range: str = Query(None),
-    session: AsyncSession = Depends(get_session),
+    cursor: str = Query(None),
+    q: str = Query(None),
+    session: AsyncSession = Depends(get_read_session),
 ):
     """Get all licors"""
 
-    sort = orjson.loads(sort) if sort else []
-    range = orjson.loads(range) if range else []
-    filter = orjson.loads(filter) if filter else {}
-
-    # Do a query to satisfy total count for "Content-Range" header
-    count_query = select(func.count(LICORData.iterator))
-    if len(filter):  # Have to filter twice for some reason? SQLModel state?
-        for field, value in filter.items():
-            if isinstance(value, list):
-                count_query = count_query.where(
-                    getattr(LICORData, field).in_(value)
-                )
-            elif field == "id" or field == "site_id":
-                count_query = count_query.where(
-                    getattr(LICORData, field) == value
-                )
-            else:
-                count_query = count_query.where(
-                    getattr(LICORData, field).like(f"%{value}%")
-                )
+    if config.FAST_LIST_RESPONSES:
+        return list_response(
+            response,
+            await licor_list_query.paginate(
+                session,
+                response,
+                filter=filter,
+                sort=sort,
+                range=range,
+                cursor=cursor,
+                query_filter=filter_params(q),
+                as_rows=True,
+            ),
+        )
+
+    return await licor_list_query.paginate(
+        session,
+        response,
+        filter=filter,
+        sort=sort,
+        range=range,
+        cursor=cursor,
+        query_filter=filter_params(q),
+    )
 
-    # Execute total count query (including filter)
-    total_count_query = await session.execute(count_query)
-    total_count = total_count_query.scalar_one()
-
-    query = select(LICORData)
-    # Order by sort field params ie. ["name","ASC"]
-    if len(sort) == 2:
-        sort_field, sort_order = sort
-        if sort_order == "ASC":
-            query = query.order_by(getattr(LICORData, sort_field))
-        else:
-            query = query.order_by(getattr(LICORData, sort_field).desc())
-
-    # Filter by filter field params ie. {"name":"bar"}
-    if len(filter):
-        for field, value in filter.items():
-            if isinstance(value, list):
-                query = query.where(getattr(LICORData, field).in_(value))
-            elif field == "id" or field == "site_id":
-                query = query.where(getattr(LICORData, field) == value)
-            else:
-                query = query.where(
-                    getattr(LICORData, field).like(f"%{value}%")
-                )
 
-    if len(range) == 2:
-        start, end = range
-        query = query.offset(start).limit(end - start + 1)
-    else:
-        start, end = [0, total_count]  # For content-range header
+async def create_licor_record(
+    session: AsyncSession,
+    serialised_json: dict,
+    rawdata: bytes,
+) -> LICORData:
+    """Adds a licor record and its datasets from a parsed LICOR file
+
+    The record keeps the metadata of the file (the file without its
+    datasets), each dataset is a LICORDatasetData row, and the file as sent
+    is stored gzip compressed, to be served as is.
+    """
+
+    try:
+        # Convert integer timestamp to datetime
+        converted_date = datetime.datetime.fromtimestamp(
+            serialised_json["date"]
+        )
+        obj = LICORData(
+            name=serialised_json["name"],
+            description=serialised_json.get("remark"),
+            recorded_at=converted_date,
+            data={
+                key: value
+                for key, value in serialised_json.items()
+                if key != "datasets"
+            },
+            data_compressed=gzip.compress(
+                rawdata, compresslevel=config.LICOR_GZIP_LEVEL, mtime=0
+            ),
+        )
+    except (AttributeError, KeyError, TypeError, ValueError):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid LICOR file.",
+        )
 
-    # Execute query
-    results = await session.execute(query)
-    licors = results.scalars().all()
+    session.add(obj)
+    await session.flush()
+    datasets = split_datasets(obj.id, serialised_json)
+    session.add_all(datasets)
+    await session.commit()
+    data_changed(LICORData)
+    await session.refresh(obj)
 
-    response.headers["Content-Range"] = f"licors {start}-{end}/{total_count}"
+    # Users usually open the datasets of a file right after uploading it
+    if len(rawdata) <= UPLOAD_CACHE_MAX_SIZE:
+        cache_datasets(
+            obj.id,
+            obj.created_at,
+            {dataset.key: dataset.measurements for dataset in datasets},
+        )
 
-    return licors
+    return obj
 
 
 @router.post("", response_model=LICORDataRead)
@@ -166,12 +660,7 @@ async def create_licor(
     licor: LICORDataCreate,
     session: AsyncSession = Depends(get_session),
 ) -> LICORDataRead:
-    """Creates a licor record"""
-    # print(licor)
-
-    ####
-
-    """Creates a sensor from one or many GPX files"""
+    """Creates a licor record from a base64 encoded .json file"""
 
     # Read raw file
     rawdata = decode_base64(
@@ -179,22 +668,48 @@ async def create_licor(
         allowed_types=["data:application/json;base64"],
     )
 
-    serialised_json = orjson.loads(rawdata)
+    return await create_licor_record(session, orjson.loads(rawdata), rawdata)
+
 
-    # Convert integer timestamp to datetime
-    converted_date = datetime.datetime.fromtimestamp(serialised_json["date"])
-    obj = LICORData(
-        name=serialised_json["name"],
-        description=serialised_json["remark"],
-        recorded_at=converted_date,
-        data=orjson.loads(rawdata),
+@router.post("/upload", response_model=LICORDataRead)
+async def upload_licor(
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+) -> LICORDataRead:
+    """Creates a licor record from the .json file sent as the request body
+
+    orjson parses from a complete buffer, so the body is received into a
+    single bytearray, which is parsed and compressed without a copy. Large
+    files are not held in memory as base64 and decoded copies, as with the
+    base64 endpoint. Bodies larger than LICOR_UPLOAD_MAX_BYTES are refused
+    with a 413 as soon as they exceed it.
+    """
+
+    too_large = HTTPException(
+        status_code=413,
+        detail="LICOR file too large.",
     )
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and (
+        int(content_length) > config.LICOR_UPLOAD_MAX_BYTES
+    ):
+        raise too_large
 
-    session.add(obj)
-    await session.commit()
-    await session.refresh(obj)
+    rawdata = bytearray()
+    async for chunk in request.stream():
+        rawdata += chunk
+        if len(rawdata) > config.LICOR_UPLOAD_MAX_BYTES:
+            raise too_large
 
-    return obj
+    try:
+        serialised_json = orjson.loads(rawdata)
+    except orjson.JSONDecodeError:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid JSON file.",
+        )
+
+    return await create_licor_record(session, serialised_json, rawdata)
 
 
 @router.put("/{licor_id}", response_model=LICORDataRead)
@@ -219,6 +734,8 @@ async def update_licor(
 
     session.add(licor_db)
     await session.commit()
+    data_changed(LICORData)
+    evict_datasets(licor_id)
     await session.refresh(licor_db)
 
     return licor_db
@@ -239,3 +756,5 @@ async def delete_licor(
     if licor:
         await session.delete(licor)
         await session.commit()
+        data_changed(LICORData)
+        evict_datasets(licor_id)
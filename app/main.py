@@ -1,14 +1,27 @@
 from fastapi import FastAPI, status, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from app.config import config
-from app.db import get_session, AsyncSession
+from app.db import get_session, init_db, close_db, AsyncSession
+from app.http_cache import NegotiatedGZipMiddleware
 from app.sites.views import router as sites_router
 from app.licor.views import router as licor_router
 from app.subsites.views import router as subsites_router
 from app.fieldcampaigns.views import router as field_campaigns_router
+from app.tiles.views import router as tiles_router
 from pydantic import BaseModel
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up the database engine on startup and dispose of it on shutdown"""
+
+    await init_db()
+    yield
+    await close_db()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = ["*"]
 
@@ -20,6 +33,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress the large responses (LICOR files, datasets, exports and lists)
+# for clients accepting gzip. Responses that already have a
+# Content-Encoding, such as the stored LICOR files, are sent as is. The
+# compression runs in the thread pool, at a moderate level.
+app.add_middleware(
+    NegotiatedGZipMiddleware,
+    minimum_size=config.GZIP_MINIMUM_SIZE,
+    compresslevel=config.GZIP_LEVEL,
+)
+
 
 class HealthCheck(BaseModel):
     """Response model to validate and return when performing a health check."""
@@ -71,3 +94,8 @@ app.include_router(
     prefix=f"{config.API_V1_PREFIX}/licor",
     tags=["LICOR"],
 )
+app.include_router(
+    tiles_router,
+    prefix=f"{config.API_V1_PREFIX}/tiles",
+    tags=["tiles"],
+)
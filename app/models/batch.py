@@ -0,0 +1,13 @@
+from sqlmodel import SQLModel
+from uuid import UUID
+from typing import Any
+
+
+class BatchError(SQLModel):
+    index: int  # Position of the item in the request
+    detail: Any
+
+
+class BatchResult(SQLModel):
+    ids: list[UUID] = []  # Created, updated or deleted records
+    errors: list[BatchError] = []
@@ -0,0 +1,9 @@
+from sqlmodel import SQLModel
+from uuid import UUID
+import datetime
+
+
+class TimelineCount(SQLModel):
+    site_id: UUID | None
+    period: datetime.datetime  # Start of the day or week, in UTC
+    count: int
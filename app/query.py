@@ -0,0 +1,1099 @@
+from fastapi import HTTPException, Response
+from fastapi.responses import ORJSONResponse
+from sqlmodel import SQLModel, select
+from sqlalchemy import func, bindparam, tuple_, or_, and_, cast, text
+from sqlalchemy import literal_column
+from sqlalchemy import DateTime, Float, Text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import Select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import selectinload
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.sqltypes import GUID
+from geoalchemy2 import Geography
+from app.cache import Cache, data_version
+from app.config import config
+from typing import Any, Literal
+import operator
+import orjson
+import base64
+import datetime
+import math
+import uuid
+
+# Page size used in cursor mode when no range is given
+DEFAULT_CURSOR_PAGE_SIZE = 100
+
+# Total counts by (table, data version, filter), shared by all list queries
+count_cache = Cache(max_size=10000, ttl=config.COUNT_CACHE_TTL_SECONDS)
+
+# Filters on the geometry column of a ListQuery. Points are stored as
+# POINT(latitude longitude elevation), so x is the latitude.
+SPATIAL_FIELDS = {"bbox", "near", "within_m"}
+METERS_PER_DEGREE = 111320  # Along a meridian, and the equator
+
+# Suffixes of the range filters of a field, such as recorded_at_gte
+RANGE_OPERATORS = {
+    "gte": operator.ge,
+    "gt": operator.gt,
+    "lte": operator.le,
+    "lt": operator.lt,
+}
+
+TimelineInterval = Literal["day", "week"]
+
+
+class search_rank(FunctionElement):
+    """The relevance of a row to a search of its text columns
+
+    On PostgreSQL, the best pg_trgm word similarity of the search to the
+    columns. Elsewhere (SQLite tests), the number of columns containing it.
+    """
+
+    type = Float()
+    name = "search_rank"
+    inherit_cache = True
+
+
+@compiles(search_rank)
+def _search_rank(element, compiler, **kw):
+    *columns, search = element.clauses
+
+    # The search is compiled once per use, for positional bind parameters
+    return (
+        "("
+        + " + ".join(
+            f"(instr(lower(coalesce({compiler.process(column, **kw)}, '')),"
+            f" lower({compiler.process(search, **kw)})) > 0)"
+            for column in columns
+        )
+        + ")"
+    )
+
+
+@compiles(search_rank, "postgresql")
+def _search_rank_postgresql(element, compiler, **kw):
+    *columns, search = element.clauses
+
+    return (
+        "GREATEST("
+        + ", ".join(
+            f"word_similarity({compiler.process(search, **kw)},"
+            f" coalesce({compiler.process(column, **kw)}, ''))"
+            for column in columns
+        )
+        + ")"
+    )
+
+
+class date_bucket(FunctionElement):
+    """The start of the day or week (from Monday) of a timestamp, with
+    date_trunc on PostgreSQL"""
+
+    type = DateTime()
+    name = "date_bucket"
+    inherit_cache = True
+
+    def __init__(self, interval: TimelineInterval, column: Any):
+        self.interval = interval
+        super().__init__(literal_column(f"'{interval}'"), column)
+
+
+@compiles(date_bucket)
+def _date_bucket(element, compiler, **kw):
+    return f"date_trunc({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(date_bucket, "sqlite")
+def _date_bucket_sqlite(element, compiler, **kw):
+    column = compiler.process(element.clauses.clauses[1], **kw)
+    if element.interval == "week":
+        return (
+            f"datetime({column}, 'start of day', "
+            f"'-' || ((strftime('%w', {column}) + 6) % 7) || ' days')"
+        )
+
+    return f"datetime({column}, 'start of day')"
+
+
+def float_param(
+    name: str,
+) -> Any:
+    """A bound parameter typed for PostgreSQL, which cannot infer the type of
+    parameters in arithmetic"""
+
+    return cast(bindparam(name), Float)
+
+
+def filter_params(
+    q: str | None = None,
+    bbox: str | None = None,
+    near: str | None = None,
+    within_m: float | None = None,
+) -> dict[str, Any]:
+    """The filter of the q (search), bbox=minx,miny,maxx,maxy (longitudes
+    and latitudes), near=lat,lon and within_m query parameters"""
+
+    filter = {}
+    if q:
+        filter["q"] = q
+    try:
+        if bbox is not None:
+            filter["bbox"] = [float(value) for value in bbox.split(",")]
+        if near is not None:
+            filter["near"] = [float(value) for value in near.split(",")]
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid bbox or near parameter",
+        )
+    if within_m is not None:
+        filter["within_m"] = within_m
+
+    return filter
+
+
+class ListParams:
+    """The parsed react-admin list parameters of a request"""
+
+    def __init__(
+        self,
+        filter: dict[str, Any],
+        sort: list,
+        range: list,
+    ):
+        self.filter = filter
+        self.sort = sort
+        self.range = range
+
+
+class ListQuery:
+    """Builds and runs the list query of a model for the react-admin
+    filter, sort and range query parameters
+
+    Filter and sort fields are checked against an allowlist. The statement
+    is built once for each filter shape (which fields are filtered and how)
+    and the values are passed as bound parameters, so repeated list calls
+    reuse the same compiled SQL. The page and the total count are fetched
+    together using a count(*) OVER () window.
+
+    Total counts are cached for a few seconds and invalidated by writes to
+    the table (see app.cache.data_changed). Unfiltered lists of large tables
+    use the planner estimate rather than counting every row.
+
+    Range fields can also be filtered with the gte, gt, lte and lt suffixes
+    (such as recorded_at_gte), which compare the values in the index rather
+    than matching their text.
+
+    JSON fields, which are JSONB expressions, are filtered by containment of
+    a JSON object (PostgreSQL only), such as {"metadata": {"key": "value"}}.
+
+    Text columns listed as search fields are searched with the q filter,
+    which is case insensitive and sorts by relevance when no sort is given.
+    On PostgreSQL, it uses the pg_trgm indexes of the columns.
+
+    Models with a geometry column can also be filtered by bounding box
+    (bbox), by distance to a point (near and within_m) and are sorted by
+    distance to the near point when no sort is given. These use the GiST
+    index of the column.
+    """
+
+    def __init__(
+        self,
+        model: type[SQLModel],
+        resource: str,
+        filter_fields: list[str],
+        exact_fields: list[str] = [],
+        sort_fields: list[str] = [],
+        columns: list = [],
+        relations: dict[str, Any] = {},
+        default_include: list[str] = [],
+        geometry: Any = None,
+        search_fields: list[str] = [],
+        range_fields: list[str] = [],
+        json_fields: dict[str, Any] = {},
+    ):
+        self.model = model
+        self.resource = resource  # Used in the Content-Range header
+        self.filter_fields = set(filter_fields)
+        self.exact_fields = set(exact_fields)
+        self.sort_fields = set(sort_fields)
+        self.columns = columns  # Selected by paginate(as_rows=True)
+        self.relations = relations  # Relationships that can be included
+        self.default_include = default_include
+        self.geometry = geometry  # Point column of the spatial filters
+        self.search_fields = search_fields  # Searched by the q filter
+        self.range_fields = set(range_fields)
+        self.json_fields = json_fields  # Expressions by filter field
+
+        self._statements: dict[tuple, Select] = {}
+
+    def encode_cursor(
+        self,
+        row: SQLModel | Row,
+        params: ListParams,
+        position: int,
+    ) -> str:
+        """Encode the position after a row as an opaque cursor"""
+
+        cursor = {"i": row.iterator, "p": position}
+        if len(params.sort) == 2:
+            cursor["v"] = getattr(row, params.sort[0])
+
+        return base64.urlsafe_b64encode(orjson.dumps(cursor)).decode()
+
+    def decode_cursor(
+        self,
+        cursor: str,
+        params: ListParams,
+    ) -> dict[str, Any]:
+        """Decode a cursor, converting the sort value back to its type"""
+
+        try:
+            cursor = orjson.loads(base64.urlsafe_b64decode(cursor))
+            if not isinstance(cursor["i"], int) or not isinstance(
+                cursor["p"], int
+            ):
+                raise ValueError
+
+            if len(params.sort) == 2:
+                value = cursor["v"]
+                column = getattr(self.model, params.sort[0])
+                if value is not None:
+                    if isinstance(column.type, DateTime):
+                        value = datetime.datetime.fromisoformat(value)
+                    elif isinstance(column.type, GUID):
+                        value = uuid.UUID(value)
+                cursor["v"] = value
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid cursor",
+            )
+
+        return cursor
+
+    def parse(
+        self,
+        filter: str | None,
+        sort: str | None,
+        range: str | None,
+        query_filter: dict[str, Any] | None = None,
+    ) -> ListParams:
+        """Decode and validate the JSON encoded query parameters
+
+        The filter of the other query parameters (see filter_params) is
+        added to the filter.
+        """
+
+        try:
+            filter = orjson.loads(filter) if filter else {}
+            sort = orjson.loads(sort) if sort else []
+            range = orjson.loads(range) if range else []
+        except orjson.JSONDecodeError:
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid filter, sort or range parameter",
+            )
+
+        if query_filter and isinstance(filter, dict):
+            filter = {**filter, **query_filter}
+
+        for field in filter:
+            if field in SPATIAL_FIELDS and self.geometry is not None:
+                continue
+            if field == "q" and self.search_fields:
+                if not isinstance(filter["q"], str):
+                    raise HTTPException(
+                        status_code=400,
+                        detail="Invalid q filter, expected a string",
+                    )
+                continue
+            if field in self.json_fields:
+                if not isinstance(filter[field], dict):
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Invalid {field} filter, expected an object",
+                    )
+                continue
+            range_field = self._range_field(field)
+            if range_field is not None:
+                self._range_value(range_field, filter[field])
+                continue
+            if field not in self.filter_fields:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Cannot filter on field: {field}",
+                )
+        self._check_spatial(filter)
+
+        if len(sort) == 2:
+            sort_field, sort_order = sort
+            if sort_field not in self.sort_fields:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Cannot sort on field: {sort_field}",
+                )
+            if sort_order not in ["ASC", "DESC"]:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid sort order: {sort_order}",
+                )
+
+        if len(range) == 2 and not all(isinstance(x, int) for x in range):
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid range parameter",
+            )
+
+        return ListParams(filter=filter, sort=sort, range=range)
+
+    def included(
+        self,
+        include: str | None,
+    ) -> list[str]:
+        """The names of the relationships to load for an include parameter"""
+
+        if include is None:
+            return self.default_include
+
+        names = [name for name in include.split(",") if name]
+        for name in names:
+            if name not in self.relations:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Cannot include: {name}",
+                )
+
+        return names
+
+    def load_options(
+        self,
+        include: str | None,
+    ) -> list:
+        """Loader options for the relationships of an include parameter"""
+
+        return [
+            selectinload(self.relations[name])
+            for name in self.included(include)
+        ]
+
+    def _check_spatial(
+        self,
+        filter: dict[str, Any],
+    ) -> None:
+        def numbers(value: Any, count: int) -> bool:
+            return (
+                isinstance(value, list)
+                and len(value) == count
+                and all(
+                    isinstance(x, (int, float)) and math.isfinite(x)
+                    for x in value
+                )
+            )
+
+        if "bbox" in filter and not numbers(filter["bbox"], 4):
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid bbox filter, expected [minx, miny, maxx, maxy]",
+            )
+        if "near" in filter and not numbers(filter["near"], 2):
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid near filter, expected [latitude, longitude]",
+            )
+        if "within_m" in filter and (
+            "near" not in filter
+            or not numbers([filter["within_m"]], 1)
+            or filter["within_m"] < 0
+        ):
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid within_m filter, a distance from near",
+            )
+
+    def _range_field(
+        self,
+        field: str,
+    ) -> str | None:
+        """The field compared by a range filter, such as recorded_at for
+        recorded_at_gte, or None if it is not one"""
+
+        name, _, suffix = field.rpartition("_")
+        if suffix in RANGE_OPERATORS and name in self.range_fields:
+            return name
+
+        return None
+
+    def _range_value(
+        self,
+        field: str,
+        value: Any,
+    ) -> Any:
+        """The value of a range filter, as the type of the field"""
+
+        column = getattr(self.model, field)
+        try:
+            if isinstance(column.type, DateTime):
+                value = datetime.datetime.fromisoformat(value)
+                if value.tzinfo is not None:
+                    # Timestamps are stored in UTC without a timezone
+                    value = value.astimezone(datetime.timezone.utc).replace(
+                        tzinfo=None
+                    )
+            elif not isinstance(value, (int, float)) or isinstance(
+                value, bool
+            ):
+                raise ValueError
+        except (ValueError, TypeError):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid range filter on field: {field}",
+            )
+
+        return value
+
+    def _filter_kind(
+        self,
+        field: str,
+        value: Any,
+    ) -> str:
+        if field in SPATIAL_FIELDS and self.geometry is not None:
+            return field
+        elif field == "q" and self.search_fields:
+            return "search"
+        elif field in self.json_fields:
+            return "contains"
+        elif self._range_field(field) is not None:
+            return field.rpartition("_")[2]
+        elif isinstance(value, list):
+            return "in"
+        elif field in self.exact_fields:
+            return "eq"
+        else:
+            return "like"
+
+    def filter_shape(
+        self,
+        params: ListParams,
+    ) -> tuple:
+        """The structure of the filter, independent of the filter values"""
+
+        return tuple(
+            sorted(
+                (field, self._filter_kind(field, value))
+                for field, value in params.filter.items()
+            )
+        )
+
+    def filter_values(
+        self,
+        params: ListParams,
+    ) -> dict[str, Any]:
+        """The bound parameter values of the filter"""
+
+        values = {}
+        for field, value in params.filter.items():
+            kind = self._filter_kind(field, value)
+            if kind == "bbox":
+                minx, miny, maxx, maxy = value
+                values.update(
+                    filter_bbox_minx=minx,
+                    filter_bbox_miny=miny,
+                    filter_bbox_maxx=maxx,
+                    filter_bbox_maxy=maxy,
+                )
+                continue
+            elif kind == "near":
+                latitude, longitude = value
+                values.update(
+                    filter_near_latitude=latitude,
+                    filter_near_longitude=longitude,
+                )
+                continue
+            elif kind == "within_m":
+                # The box around the near point that contains the circle,
+                # in degrees, which the index can be searched with
+                latitude = params.filter["near"][0]
+                values.update(
+                    filter_within_m=value,
+                    filter_within_dlat=value / METERS_PER_DEGREE,
+                    filter_within_dlon=min(
+                        value
+                        / METERS_PER_DEGREE
+                        / max(math.cos(math.radians(latitude)), 1e-6),
+                        360,
+                    ),
+                )
+                continue
+            elif kind == "search":
+                escaped = (
+                    value.replace("\\", "\\\\")
+                    .replace("%", "\\%")
+                    .replace("_", "\\_")
+                )
+                values["filter_q_pattern"] = f"%{escaped}%"
+            elif kind in RANGE_OPERATORS:
+                value = self._range_value(self._range_field(field), value)
+            elif kind == "like":
+                value = f"%{value}%"
+            values[f"filter_{field}"] = value
+
+        return values
+
+    def near_point(self) -> Any:
+        """The near point of the filter, in the order of the stored points"""
+
+        return func.ST_SetSRID(
+            func.ST_MakePoint(
+                float_param("filter_near_latitude"),
+                float_param("filter_near_longitude"),
+            ),
+            4326,
+        )
+
+    def _where_spatial(
+        self,
+        statement: Select,
+        kind: str,
+    ) -> Select:
+        if kind == "bbox":
+            # minx and maxx are longitudes, which are the y of the points
+            return statement.where(
+                self.geometry.op("&&")(
+                    func.ST_MakeEnvelope(
+                        float_param("filter_bbox_miny"),
+                        float_param("filter_bbox_minx"),
+                        float_param("filter_bbox_maxy"),
+                        float_param("filter_bbox_maxx"),
+                        4326,
+                    )
+                )
+            )
+
+        if kind == "within_m":
+            latitude = float_param("filter_near_latitude")
+            longitude = float_param("filter_near_longitude")
+            dlat = float_param("filter_within_dlat")
+            dlon = float_param("filter_within_dlon")
+
+            # Search the index with the surrounding box, then check the
+            # distance in meters on the spheroid
+            return statement.where(
+                and_(
+                    self.geometry.op("&&")(
+                        func.ST_MakeEnvelope(
+                            latitude - dlat,
+                            longitude - dlon,
+                            latitude + dlat,
+                            longitude + dlon,
+                            4326,
+                        )
+                    ),
+                    func.ST_DWithin(
+                        cast(
+                            func.ST_FlipCoordinates(self.geometry),
+                            Geography(srid=4326),
+                        ),
+                        cast(
+                            func.ST_SetSRID(
+                                func.ST_MakePoint(longitude, latitude), 4326
+                            ),
+                            Geography(srid=4326),
+                        ),
+                        float_param("filter_within_m"),
+                    ),
+                )
+            )
+
+        return statement  # near only sorts
+
+    def where(
+        self,
+        statement: Select,
+        shape: tuple,
+    ) -> Select:
+        """Apply the filter clauses of a shape to a statement"""
+
+        for field, kind in shape:
+            if kind in SPATIAL_FIELDS:
+                statement = self._where_spatial(statement, kind)
+                continue
+            if kind == "search":
+                pattern = bindparam("filter_q_pattern")
+                statement = statement.where(
+                    or_(
+                        *[
+                            getattr(self.model, field).ilike(
+                                pattern, escape="\\"
+                            )
+                            for field in self.search_fields
+                        ]
+                    )
+                )
+                continue
+            if kind == "contains":
+                param = bindparam(f"filter_{field}", type_=JSONB())
+                statement = statement.where(
+                    self.json_fields[field].op("@>")(param)
+                )
+                continue
+            if kind in RANGE_OPERATORS:
+                column = getattr(self.model, self._range_field(field))
+                param = bindparam(f"filter_{field}", type_=column.type)
+                statement = statement.where(
+                    RANGE_OPERATORS[kind](column, param)
+                )
+                continue
+
+            column = getattr(self.model, field)
+            param = bindparam(f"filter_{field}", expanding=(kind == "in"))
+            if kind == "in":
+                statement = statement.where(column.in_(param))
+            elif kind == "eq":
+                statement = statement.where(column == param)
+            else:
+                statement = statement.where(column.like(param))
+
+        return statement
+
+    def _statement(
+        self,
+        params: ListParams,
+        keyset: str | None = None,
+        counted: bool = True,
+        as_rows: bool = False,
+    ) -> Select:
+        key = (
+            self.filter_shape(params),
+            tuple(params.sort) if len(params.sort) == 2 else None,
+            len(params.range) == 2,
+            keyset,
+            counted,
+            as_rows,
+        )
+        if key in self._statements:
+            return self._statements[key]
+
+        shape, sort, paginated, keyset, counted, as_rows = key
+        if as_rows:
+            # The iterator and sort field are needed for the next cursor
+            entities = list(self.columns)
+            for column in [
+                self.model.iterator,
+                getattr(self.model, sort[0]) if sort else None,
+            ]:
+                if column is not None and not any(
+                    column is entity for entity in entities
+                ):
+                    entities.append(column)
+        else:
+            entities = [self.model]
+        if counted:
+            entities.append(func.count().over().label("total_count"))
+
+        statement = select(*entities)
+        statement = self.where(statement, shape)
+
+        if keyset:
+            statement = self._keyset(statement, sort, keyset)
+            statement = statement.limit(bindparam("limit"))
+        else:
+            statement = self._order(statement, shape, sort)
+            if paginated:
+                statement = statement.offset(bindparam("offset")).limit(
+                    bindparam("limit")
+                )
+
+        self._statements[key] = statement
+
+        return statement
+
+    def _order(
+        self,
+        statement: Select,
+        shape: tuple,
+        sort: tuple | None,
+    ) -> Select:
+        # Order by sort field params ie. ["name","ASC"]
+        if sort:
+            sort_field, sort_order = sort
+            column = getattr(self.model, sort_field)
+            statement = statement.order_by(
+                column if sort_order == "ASC" else column.desc()
+            )
+        elif ("q", "search") in shape:
+            # Most relevant first, then nearest
+            statement = statement.order_by(
+                search_rank(
+                    *[getattr(self.model, f) for f in self.search_fields],
+                    cast(bindparam("filter_q"), Text),
+                ).desc()
+            )
+            if ("near", "near") in shape:
+                statement = statement.order_by(
+                    self.geometry.op("<->")(self.near_point())
+                )
+            statement = statement.order_by(self.model.iterator)
+        elif ("near", "near") in shape:
+            # Nearest first, using the index (k-nearest neighbours)
+            statement = statement.order_by(
+                self.geometry.op("<->")(self.near_point())
+            )
+
+        return statement
+
+    def select(
+        self,
+        params: ListParams,
+        *entities: Any,
+    ) -> tuple[Select, dict[str, Any]]:
+        """A statement of other entities than the list rows (such as GeoJSON
+        features) for the same filter, sort and range, and its values"""
+
+        shape = self.filter_shape(params)
+        statement = self._order(
+            self.where(select(*entities), shape),
+            shape,
+            tuple(params.sort) if len(params.sort) == 2 else None,
+        )
+        values = self.filter_values(params)
+
+        if len(params.range) == 2:
+            start, end = params.range
+            statement = statement.offset(bindparam("offset")).limit(
+                bindparam("limit")
+            )
+            values["offset"] = start
+            values["limit"] = max(end - start + 1, 0)
+
+        return statement, values
+
+    def _keyset(
+        self,
+        statement: Select,
+        sort: tuple | None,
+        keyset: str,
+    ) -> Select:
+        """Order by (sort field, iterator) and start after the cursor
+
+        The keyset is "first" for the first page, "value" to start after a
+        row with a sort value and "null" to start after a null sort value.
+        """
+
+        iterator = self.model.iterator
+        after_iterator = bindparam("after_iterator")
+
+        if not sort:
+            if keyset != "first":
+                statement = statement.where(iterator > after_iterator)
+            return statement.order_by(iterator)
+
+        sort_field, sort_order = sort
+        column = getattr(self.model, sort_field)
+        after_value = bindparam("after_value", type_=column.type)
+        ascending = sort_order == "ASC"
+
+        if ascending:
+            after_null = iterator > after_iterator
+            after_row = tuple_(column, iterator) > tuple_(
+                after_value, after_iterator
+            )
+        else:
+            after_null = iterator < after_iterator
+            after_row = tuple_(column, iterator) < tuple_(
+                after_value, after_iterator
+            )
+
+        # Nulls are always sorted last so that a page can end on one
+        if keyset == "null":
+            statement = statement.where(column.is_(None), after_null)
+        elif keyset == "value":
+            statement = statement.where(or_(after_row, column.is_(None)))
+
+        return statement.order_by(
+            column.nulls_last() if ascending else column.desc().nulls_last(),
+            iterator if ascending else iterator.desc(),
+        )
+
+    async def timeline(
+        self,
+        session: AsyncSession,
+        params: ListParams,
+        interval: TimelineInterval,
+        field: str = "recorded_at",
+        group_field: str = "site_id",
+    ) -> list[Row]:
+        """Count the rows matching the filter by group and by day or week
+        of a timestamp field, ordered by period"""
+
+        group = getattr(self.model, group_field)
+        period = date_bucket(interval, getattr(self.model, field))
+
+        statement = self.where(
+            select(
+                group.label(group_field),
+                period.label("period"),
+                func.count(self.model.iterator).label("count"),
+            ),
+            self.filter_shape(params),
+        )
+        statement = statement.group_by(group, period).order_by(period, group)
+        res = await session.execute(statement, self.filter_values(params))
+
+        return res.all()
+
+    async def count(
+        self,
+        session: AsyncSession,
+        params: ListParams,
+    ) -> int:
+        """Count the rows matching the filter"""
+
+        statement = self.where(
+            select(func.count(self.model.iterator)),
+            self.filter_shape(params),
+        )
+        res = await session.execute(
+            statement, params=self.filter_values(params)
+        )
+
+        return res.scalar_one()
+
+    async def estimate_count(
+        self,
+        session: AsyncSession,
+    ) -> int | None:
+        """The planner estimate of the number of rows in the table
+
+        Only returned on PostgreSQL for tables large enough that an exact
+        count costs more than the page itself.
+        """
+
+        if session.bind.dialect.name != "postgresql":
+            return None
+
+        res = await session.execute(
+            text(
+                "SELECT reltuples::bigint FROM pg_class "
+                "WHERE oid = CAST(:table AS regclass)"
+            ),
+            params={"table": self.model.__tablename__},
+        )
+        estimate = res.scalar_one_or_none()
+
+        if estimate is None or estimate < config.COUNT_ESTIMATE_MIN_ROWS:
+            return None  # Not analyzed yet or small enough to count
+
+        return estimate
+
+    def _count_key(
+        self,
+        params: ListParams,
+    ) -> tuple:
+        return (
+            self.model.__tablename__,
+            data_version(self.model),
+            orjson.dumps(params.filter, option=orjson.OPT_SORT_KEYS),
+        )
+
+    async def cached_count(
+        self,
+        session: AsyncSession,
+        params: ListParams,
+        key: tuple,
+    ) -> int | None:
+        """The total count from the cache or, for unfiltered lists of large
+        tables, the planner estimate. None if it has to be counted.
+
+        The key is that of _count_key(), taken before the page is queried,
+        so that a count is never stored under the data version of a write
+        committed while it was counted.
+        """
+
+        total_count = count_cache.get(key)
+
+        if total_count is None and not params.filter:
+            total_count = await self.estimate_count(session)
+            if total_count is not None:
+                count_cache.set(key, total_count)
+
+        return total_count
+
+    async def paginate(
+        self,
+        session: AsyncSession,
+        response: Response,
+        filter: str | None,
+        sort: str | None,
+        range: str | None,
+        cursor: str | None = None,
+        as_rows: bool = False,
+        include: str | None = None,
+        query_filter: dict[str, Any] | None = None,
+    ) -> list:
+        """Get a page of records and set the Content-Range header"""
+
+        params = self.parse(filter, sort, range, query_filter)
+        values = self.filter_values(params)
+        options = [] if as_rows else self.load_options(include)
+        count_key = self._count_key(params)
+        total_count = await self.cached_count(session, params, count_key)
+
+        if cursor is not None:
+            if len(params.sort) != 2 and (
+                "near" in params.filter or "q" in params.filter
+            ):
+                raise HTTPException(
+                    status_code=400,
+                    detail="Cannot use a cursor when sorting by relevance "
+                    "or distance, a sort is needed",
+                )
+            return await self._paginate_keyset(
+                session,
+                response,
+                params,
+                values,
+                cursor,
+                total_count,
+                count_key,
+                as_rows,
+                options,
+            )
+
+        if len(params.range) == 2:
+            start, end = params.range
+            values["offset"] = start
+            values["limit"] = max(end - start + 1, 0)
+
+        res = await session.execute(
+            self._statement(
+                params, counted=total_count is None, as_rows=as_rows
+            ).options(*options),
+            params=values,
+        )
+        rows = res.all()
+
+        if total_count is None:
+            if rows:
+                total_count = rows[0].total_count
+            elif len(params.range) == 2 and params.range[0] > 0:
+                # The window count is not available past the last page
+                total_count = await self.count(session, params)
+            else:
+                total_count = 0
+            count_cache.set(count_key, total_count)
+
+        if len(params.range) != 2:
+            start, end = [0, total_count]  # For content-range header
+
+        response.headers["Content-Range"] = (
+            f"{self.resource} {start}-{end}/{total_count}"
+        )
+
+        return self._results(rows, as_rows)
+
+    def _results(
+        self,
+        rows: list,
+        as_rows: bool,
+    ) -> list:
+        if not as_rows:
+            return [row[0] for row in rows]
+
+        keys = [column.key for column in self.columns]
+        return [{key: row._mapping[key] for key in keys} for row in rows]
+
+    async def _paginate_keyset(
+        self,
+        session: AsyncSession,
+        response: Response,
+        params: ListParams,
+        values: dict[str, Any],
+        cursor: str,
+        total_count: int | None,
+        count_key: tuple,
+        as_rows: bool,
+        options: list,
+    ) -> list:
+        if cursor:
+            after = self.decode_cursor(cursor, params)
+            values["after_iterator"] = after["i"]
+            position = after["p"]
+            if len(params.sort) != 2:
+                keyset = "value"
+            elif after["v"] is None:
+                keyset = "null"
+            else:
+                keyset = "value"
+                values["after_value"] = after["v"]
+        else:
+            keyset = "first"
+            position = 0
+
+        if len(params.range) == 2:
+            page_size = max(params.range[1] - params.range[0] + 1, 0)
+        else:
+            page_size = DEFAULT_CURSOR_PAGE_SIZE
+        values["limit"] = page_size + 1  # One more to know if there is a next
+
+        res = await session.execute(
+            self._statement(
+                params, keyset, counted=total_count is None, as_rows=as_rows
+            ).options(*options),
+            params=values,
+        )
+        rows = res.all()
+
+        if total_count is None:
+            # The window counts the rows from the cursor onwards
+            total_count = position + (rows[0].total_count if rows else 0)
+            if not cursor:
+                count_cache.set(count_key, total_count)
+
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            response.headers["X-Next-Cursor"] = self.encode_cursor(
+                rows[-1] if as_rows else rows[-1][0],
+                params,
+                position + len(rows),
+            )
+
+        end = position + max(len(rows) - 1, 0)
+        response.headers["Content-Range"] = (
+            f"{self.resource} {position}-{end}/{total_count}"
+        )
+
+        return self._results(rows, as_rows)
+
+
+def list_response(
+    response: Response,
+    content: list,
+) -> ORJSONResponse:
+    """Serialize a list of plain rows with orjson, keeping the headers set
+    on the response by paginate()"""
+
+    headers = {
+        key: response.headers[key]
+        for key in ["Content-Range", "X-Next-Cursor"]
+        if key in response.headers
+    }
+
+    return ORJSONResponse(content, headers=headers)
+
+
+def read_columns(
+    model: type[SQLModel],
+    read_model: type[SQLModel],
+) -> list:
+    """The columns of a table model that its read model returns, to select
+    them as plain rows serialised like the model objects"""
+
+    return [
+        getattr(model, column.key)
+        for column in model.__table__.columns
+        if column.key in read_model.__fields__
+    ]
@@ -7,6 +7,7 @@ from pydantic import validator, root_validator
 from typing import TYPE_CHECKING
 from typing import List
 import datetime
+from app.utils import trigram_index
 
 if TYPE_CHECKING:
     from app.subsites.models import SubSite
@@ -24,7 +25,12 @@ class SiteBase(SQLModel):
 
 
 class Site(SiteBase, table=True):
-    __table_args__ = (UniqueConstraint("id"),)
+    __table_args__ = (
+        UniqueConstraint("id"),
+        trigram_index("site", "name"),
+        trigram_index("site", "description"),
+        trigram_index("site", "location"),
+    )
     iterator: int = Field(
         default=None,
         nullable=False,
@@ -44,16 +50,20 @@ class Site(SiteBase, table=True):
     )
     geom: Any | None = Field(sa_column=Column(Geometry("POINTZ", srid=4326)))
 
+    # Relationships are not loaded unless requested with loader options,
+    # see app.query.load_options
     field_campaign: "FieldCampaign" = Relationship(
-        back_populates="sites", sa_relationship_kwargs={"lazy": "selectin"}
+        back_populates="sites", sa_relationship_kwargs={"lazy": "raise"}
     )
 
     subsites: List["SubSite"] = Relationship(
-        back_populates="site", sa_relationship_kwargs={"lazy": "selectin"}
+        back_populates="site",
+        sa_relationship_kwargs={"lazy": "raise", "passive_deletes": True},
     )
 
     licordata: List["LICORData"] = Relationship(
-        back_populates="site", sa_relationship_kwargs={"lazy": "selectin"}
+        back_populates="site",
+        sa_relationship_kwargs={"lazy": "raise", "passive_deletes": True},
     )
 
 
@@ -71,6 +81,10 @@ class SiteRead(SiteBase):
     def convert_wkb_to_lat_lon(cls, values: dict) -> dict:
         """Form the geometry from the latitude and longitude and elevation"""
 
+        if isinstance(values["geom"], dict):
+            # Already decoded, as by app.utils.decode_points in list views
+            return values
+
         if isinstance(values["geom"], WKBElement):
             if values["geom"] is not None:
                 shapely_obj = shapely.wkb.loads(str(values["geom"]))
@@ -108,8 +122,8 @@ class SiteCreate(SiteBase):
                 lat=values["latitude"],
                 lon=values["longitude"],
                 # Elevation can be None, if so then set to 0
-                elevation=values["elevation"]
-                if values["elevation"] is not None
+                elevation=values.get("elevation")
+                if values.get("elevation") is not None
                 else 0,
             )
 
@@ -134,8 +148,8 @@ class SiteUpdate(SiteBase):
                 lat=values["latitude"],
                 lon=values["longitude"],
                 # Elevation can be None, if so then set to 0
-                elevation=values["elevation"]
-                if values["elevation"] is not None
+                elevation=values.get("elevation")
+                if values.get("elevation") is not None
                 else 0,
             )
 
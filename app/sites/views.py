@@ -1,25 +1,157 @@
-from fastapi import Depends, APIRouter, Query, Response, Body, HTTPException
+from fastapi import (
+    Depends,
+    APIRouter,
+    Query,
+    Response,
+    Body,
+    HTTPException,
+    Request,
+)
+from fastapi.responses import StreamingResponse
 from sqlmodel import select
-from app.db import get_session, AsyncSession
+from sqlalchemy import update, delete, and_, exists
+from app.db import get_session, get_read_session, AsyncSession
 from app.sites.models import Site, SiteCreate, SiteRead, SiteUpdate
+from app.licor.models import LICORData
+from app.subsites.models import SubSite
+from app.fieldcampaigns.models import FieldCampaign
+from app.query import ListQuery, list_response, filter_params, read_columns
+from app.config import config
+from app.cache import data_changed
+from app.http_cache import etag, cache_headers, not_modified, vary_encoding
+from app.utils import (
+    decode_points,
+    geojson_feature,
+    stream_feature_collection,
+)
+from app.batch import (
+    validate_items,
+    validate_updates,
+    existing_ids,
+    insert_rows,
+    update_rows,
+)
+from app.models.batch import BatchError, BatchResult
 from uuid import UUID
-from sqlalchemy import func
-import json
+from typing import Any
 
 router = APIRouter()
 
+site_list_query = ListQuery(
+    Site,
+    resource="sites",
+    filter_fields=[
+        "id",
+        "name",
+        "description",
+        "field_campaign_id",
+        "location",
+    ],
+    exact_fields=["id", "field_campaign_id"],
+    sort_fields=[
+        "id",
+        "name",
+        "description",
+        "field_campaign_id",
+        "location",
+        "created_at",
+    ],
+    columns=read_columns(Site, SiteRead),
+    geometry=Site.geom,
+    relations={"field_campaign": Site.field_campaign},
+    default_include=["field_campaign"],  # Returned in SiteRead
+    search_fields=["name", "description", "location"],
+)
+
+
+async def get_site_by_id(
+    session: AsyncSession,
+    site_id: UUID,
+    include: str | None = None,
+) -> Site | None:
+    """Get a site with the relationships requested by include"""
+
+    res = await session.execute(
+        select(Site)
+        .options(*site_list_query.load_options(include))
+        .where(Site.id == site_id)
+        .execution_options(populate_existing=True)
+    )
+
+    return res.scalars().one_or_none()
+
 
 @router.get("/{site_id}", response_model=SiteRead)
 async def get_site(
-    session: AsyncSession = Depends(get_session),
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session),
+    include: str = Query(None),
     *,
     site_id: UUID,
 ) -> SiteRead:
     """Get an site by id"""
-    res = await session.execute(select(Site).where(Site.id == site_id))
-    site = res.scalars().one_or_none()
 
-    return site
+    site = await get_site_by_id(session, site_id, include)
+
+    if not site:
+        raise HTTPException(status_code=404, detail="Site not found")
+
+    included = site_list_query.included(include)
+    site_read = {
+        **site.dict(),
+        "field_campaign": site.field_campaign
+        if "field_campaign" in included
+        else None,
+    }
+
+    headers = vary_encoding(request, cache_headers(etag(site_read)))
+    if not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+    return site_read
+
+
+@router.get(".geojson")
+async def get_sites_geojson(
+    filter: str = Query(None),
+    sort: str = Query(None),
+    range: str = Query(None),
+    q: str = Query(None),
+    bbox: str = Query(None),
+    near: str = Query(None),
+    within_m: float = Query(None),
+    session: AsyncSession = Depends(get_read_session),
+) -> StreamingResponse:
+    """Get the sites as a GeoJSON FeatureCollection
+
+    The features are built by the database and streamed as they are read,
+    with the same filters as the list endpoint.
+    """
+
+    params = site_list_query.parse(
+        filter, sort, range, filter_params(q, bbox, near, within_m)
+    )
+    statement, values = site_list_query.select(
+        params,
+        geojson_feature(
+            Site.id,
+            Site.geom,
+            {
+                "name": Site.name,
+                "description": Site.description,
+                "field_campaign_id": Site.field_campaign_id,
+                "location": Site.location,
+                "created_at": Site.created_at,
+            },
+        ),
+    )
+
+    return StreamingResponse(
+        stream_feature_collection(await session.stream(statement, values)),
+        media_type="application/geo+json",
+    )
 
 
 @router.get("", response_model=list[SiteRead])
@@ -28,65 +160,81 @@ async def get_sites(
     filter: str = Query(None),
     sort: str = Query(None),
     range: str = Query(None),
-    session: AsyncSession = Depends(get_session),
+    cursor: str = Query(None),
+    q: str = Query(None),
+    bbox: str = Query(None),
+    near: str = Query(None),
+    within_m: float = Query(None),
+    include: str = Query(None),
+    session: AsyncSession = Depends(get_read_session),
 ):
     """Get all sites"""
 
-    sort = json.loads(sort) if sort else []
-    range = json.loads(range) if range else []
-    filter = json.loads(filter) if filter else {}
-
-    # Do a query to satisfy total count for "Content-Range" header
-    count_query = select(func.count(Site.iterator))
-    if len(filter):  # Have to filter twice for some reason? SQLModel state?
-        for field, value in filter.items():
-            if isinstance(value, list):
-                count_query = count_query.where(
-                    getattr(Site, field).in_(value)
-                )
-            elif field == "id" or field == "field_campaign_id":
-                count_query = count_query.where(getattr(Site, field) == value)
-            else:
-                count_query = count_query.where(
-                    getattr(Site, field).like(f"%{value}%")
-                )
+    included = site_list_query.included(include)
 
-    # Execute total count query (including filter)
-    total_count_query = await session.execute(count_query)
-    total_count = total_count_query.scalar_one()
+    if config.FAST_LIST_RESPONSES:
+        rows = await site_list_query.paginate(
+            session,
+            response,
+            filter=filter,
+            sort=sort,
+            range=range,
+            cursor=cursor,
+            query_filter=filter_params(q, bbox, near, within_m),
+            as_rows=True,
+        )
+        points = decode_points([row.pop("geom") for row in rows])
 
-    query = select(Site)
-    # Order by sort field params ie. ["name","ASC"]
-    if len(sort) == 2:
-        sort_field, sort_order = sort
-        if sort_order == "ASC":
-            query = query.order_by(getattr(Site, sort_field))
-        else:
-            query = query.order_by(getattr(Site, sort_field).desc())
-
-    # Filter by filter field params ie. {"name":"bar"}
-    if len(filter):
-        for field, value in filter.items():
-            if isinstance(value, list):
-                query = query.where(getattr(Site, field).in_(value))
-            elif field == "id" or field == "field_campaign_id":
-                query = query.where(getattr(Site, field) == value)
-            else:
-                query = query.where(getattr(Site, field).like(f"%{value}%"))
+        field_campaigns = {}
+        if "field_campaign" in included:
+            # SiteRead returns the FieldCampaign objects themselves
+            res = await session.execute(
+                select(*read_columns(FieldCampaign, FieldCampaign)).where(
+                    FieldCampaign.id.in_(
+                        {row["field_campaign_id"] for row in rows}
+                    )
+                )
+            )
+            field_campaigns = {row.id: dict(row._mapping) for row in res.all()}
 
-    if len(range) == 2:
-        start, end = range
-        query = query.offset(start).limit(end - start + 1)
-    else:
-        start, end = [0, total_count]  # For content-range header
+        return list_response(
+            response,
+            [
+                {
+                    **row,
+                    **point,
+                    "field_campaign": field_campaigns.get(
+                        row["field_campaign_id"]
+                    ),
+                }
+                for row, point in zip(rows, points)
+            ],
+        )
 
-    # Execute query
-    results = await session.execute(query)
-    sites = results.scalars().all()
+    sites = await site_list_query.paginate(
+        session,
+        response,
+        filter=filter,
+        sort=sort,
+        range=range,
+        cursor=cursor,
+        query_filter=filter_params(q, bbox, near, within_m),
+        include=include,
+    )
 
-    response.headers["Content-Range"] = f"sites {start}-{end}/{total_count}"
+    # Decode all geometries at once instead of in each SiteRead validator
+    points = decode_points([site.geom for site in sites])
 
-    return sites
+    return [
+        {
+            **site.dict(),
+            **point,
+            "field_campaign": site.field_campaign
+            if "field_campaign" in included
+            else None,
+        }
+        for site, point in zip(sites, points)
+    ]
 
 
 @router.post("", response_model=SiteRead)
@@ -99,9 +247,149 @@ async def create_site(
     site = Site.from_orm(site)
     session.add(site)
     await session.commit()
-    await session.refresh(site)
+    data_changed(Site)
+
+    return await get_site_by_id(session, site.id)
+
+
+@router.post("/batch", response_model=BatchResult)
+async def create_sites(
+    sites: list[Any] = Body(...),
+    session: AsyncSession = Depends(get_session),
+) -> BatchResult:
+    """Creates many sites in one transaction
+
+    Invalid items are reported by their index and the others are created.
+    """
+
+    valid, errors = validate_items(sites, SiteCreate)
+    field_campaign_ids = await existing_ids(
+        session,
+        FieldCampaign.id,
+        {site.field_campaign_id for index, site in valid},
+    )
+
+    ids = []
+    rows = []
+    for index, site in valid:
+        if (
+            site.field_campaign_id is not None
+            and site.field_campaign_id not in field_campaign_ids
+        ):
+            errors.append(
+                BatchError(index=index, detail="Field campaign not found")
+            )
+            continue
+
+        row = Site.from_orm(site).dict(exclude={"iterator"})
+        ids.append(row["id"])
+        rows.append(row)
+
+    await insert_rows(session, Site, rows)
+    await session.commit()
+    data_changed(Site)
+
+    return BatchResult(
+        ids=ids, errors=sorted(errors, key=lambda error: error.index)
+    )
+
+
+@router.put("/batch", response_model=BatchResult)
+async def update_sites(
+    sites: list[Any] = Body(...),
+    session: AsyncSession = Depends(get_session),
+) -> BatchResult:
+    """Updates many sites in one transaction
+
+    Each item holds the id of the site and the fields to update.
+    """
+
+    valid, errors = validate_updates(sites, SiteUpdate)
+    site_ids = await existing_ids(
+        session, Site.id, {id for index, id, values in valid}
+    )
+    field_campaign_ids = await existing_ids(
+        session,
+        FieldCampaign.id,
+        {values.get("field_campaign_id") for index, id, values in valid},
+    )
+
+    updates = {}
+    for index, id, values in valid:
+        if id not in site_ids:
+            errors.append(BatchError(index=index, detail="Site not found"))
+            continue
+        if (
+            values.get("field_campaign_id") is not None
+            and values["field_campaign_id"] not in field_campaign_ids
+        ):
+            errors.append(
+                BatchError(index=index, detail="Field campaign not found")
+            )
+            continue
+
+        updates.setdefault(id, {}).update(values)
+
+    await update_rows(session, Site, updates)
+    await session.commit()
+    data_changed(Site)
+
+    return BatchResult(
+        ids=list(updates), errors=sorted(errors, key=lambda error: error.index)
+    )
+
+
+@router.delete("/batch", response_model=BatchResult)
+async def delete_sites(
+    site_ids: list[UUID] = Body(...),
+    session: AsyncSession = Depends(get_session),
+) -> BatchResult:
+    """Deletes many sites by id in one transaction
+
+    Sites that still have subsites are not deleted.
+    """
+
+    deletable = and_(
+        Site.id.in_(set(site_ids)),
+        ~exists().where(SubSite.site_id == Site.id),
+    )
+
+    # Keep the licor records of the sites, as in delete_site
+    await session.execute(
+        update(LICORData)
+        .where(LICORData.site_id.in_(select(Site.id).where(deletable)))
+        .values(site_id=None)
+    )
+    res = await session.execute(
+        delete(Site).where(deletable).returning(Site.id)
+    )
+    deleted = set(res.scalars().all())
+
+    # Only the sites that were not deleted are looked up, to report why
+    with_subsites = set()
+    if deleted != set(site_ids):
+        res = await session.execute(
+            select(SubSite.site_id)
+            .where(SubSite.site_id.in_(set(site_ids) - deleted))
+            .distinct()
+        )
+        with_subsites = set(res.scalars().all())
+
+    ids = []
+    errors = []
+    for index, site_id in enumerate(site_ids):
+        if site_id in with_subsites:
+            errors.append(BatchError(index=index, detail="Site has subsites"))
+        elif site_id not in deleted:
+            errors.append(BatchError(index=index, detail="Site not found"))
+        elif site_id not in ids:
+            ids.append(site_id)
+
+    if ids:
+        await session.commit()
+        data_changed(Site, LICORData)
 
-    return site
+    return BatchResult(ids=ids, errors=errors)
 
 
 @router.put("/{site_id}", response_model=SiteRead)
@@ -128,9 +416,9 @@ async def update_site(
 
     session.add(site_db)
     await session.commit()
-    await session.refresh(site_db)
+    data_changed(Site)
 
-    return site_db
+    return await get_site_by_id(session, site_id)
 
 
 @router.delete("/{site_id}")
@@ -144,5 +432,12 @@ async def delete_site(
     site = res.scalars().one_or_none()
 
     if site:
+        # Keep the licor records of the site, as the ORM cascade used to
+        await session.execute(
+            update(LICORData)
+            .where(LICORData.site_id == site_id)
+            .values(site_id=None)
+        )
         await session.delete(site)
         await session.commit()
+        data_changed(Site, LICORData)  # Its licor records lose their site
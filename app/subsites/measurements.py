@@ -0,0 +1,111 @@
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import delete, func, null
+from sqlalchemy.engine import Row
+from app.subsites.models import (
+    SubSite,
+    SubSiteTemperature,
+    SubSiteLuminosity,
+    TemperatureMeasurementBase,
+    LuminosityMeasurementBase,
+)
+from app.batch import insert_rows
+from app.query import ListQuery, ListParams
+from uuid import UUID
+from typing import Any, Literal
+
+MeasurementGroup = Literal["site", "subsite"]
+
+# Table and reading fields of the measurement lists of a subsite
+MEASUREMENTS = {
+    "temperatures": (SubSiteTemperature, TemperatureMeasurementBase),
+    "luminosities": (SubSiteLuminosity, LuminosityMeasurementBase),
+}
+
+
+def measurement_rows(
+    key: str,
+    subsite_id: UUID,
+    readings: list | None,
+) -> list[dict[str, Any]]:
+    """The rows of the readings of one measurement list of a subsite"""
+
+    model, base = MEASUREMENTS[key]
+    rows = []
+    for position, reading in enumerate(readings or []):
+        reading = dict(reading)
+        row = model(
+            subsite_id=subsite_id,
+            position=position,
+            **{field: reading.get(field) for field in base.__fields__},
+        )
+        rows.append(row.dict(exclude={"iterator"}))
+
+    return rows
+
+
+async def save_measurements(
+    session: AsyncSession,
+    subsites: dict[UUID, dict[str, Any]],
+    replace: bool = False,
+) -> None:
+    """Write the temperatures and luminosities of subsites to their tables
+
+    Only the lists present in the values of a subsite are written. With
+    replace, the readings previously saved for these lists are deleted.
+    """
+
+    for key, (model, base) in MEASUREMENTS.items():
+        ids = [id for id, values in subsites.items() if key in values]
+        if replace and ids:
+            await session.execute(
+                delete(model).where(model.subsite_id.in_(ids))
+            )
+
+        rows = [
+            row
+            for id in ids
+            for row in measurement_rows(key, id, subsites[id][key])
+        ]
+        await insert_rows(session, model, rows)
+
+
+async def summarize_measurements(
+    session: AsyncSession,
+    list_query: ListQuery,
+    params: ListParams,
+    value: Any,
+    conditions: list,
+    group_by: MeasurementGroup = "site",
+) -> list[Row]:
+    """Count and aggregate a measurement column per site or subsite
+
+    The readings are those of the subsites matching the filter of the
+    subsite list, and the conditions on the measurement table.
+    """
+
+    model: type[SQLModel] = value.class_
+    groups = [SubSite.site_id]
+    subsite_id = null()
+    if group_by == "subsite":
+        groups.append(model.subsite_id)
+        subsite_id = model.subsite_id
+
+    statement = (
+        select(
+            SubSite.site_id,
+            subsite_id.label("subsite_id"),
+            func.count(value).label("count"),
+            func.avg(value).label("mean"),
+            func.min(value).label("min"),
+            func.max(value).label("max"),
+        )
+        .join(SubSite, SubSite.id == model.subsite_id)
+        .where(*conditions)
+    )
+    statement = list_query.where(statement, list_query.filter_shape(params))
+    statement = statement.group_by(*groups).order_by(*groups)
+
+    res = await session.execute(statement, list_query.filter_values(params))
+
+    return res.all()
@@ -6,7 +6,9 @@ import shapely
 from pydantic import validator, root_validator
 from typing import TYPE_CHECKING
 import datetime
-from sqlalchemy import JSON, Column
+from sqlalchemy import Column, ForeignKey, Index
+from sqlmodel.sql.sqltypes import GUID
+from app.utils import trigram_index, JSONVariant
 
 if TYPE_CHECKING:
     from app.sites.models import Site
@@ -46,15 +48,25 @@ class SubSiteBase(SQLModel):
         index=True,
     )
 
-    temperatures: list[dict] | None = Field(default=[], sa_column=Column(JSON))
-    luminosities: list[dict] | None = Field(default=[], sa_column=Column(JSON))
+    temperatures: list[dict] | None = Field(
+        default=[], sa_column=Column(JSONVariant())
+    )
+    luminosities: list[dict] | None = Field(
+        default=[], sa_column=Column(JSONVariant())
+    )
 
     class Config:
         arbitrary_types_allowed = True
 
 
 class SubSite(SubSiteBase, table=True):
-    __table_args__ = (UniqueConstraint("id"),)
+    __table_args__ = (
+        UniqueConstraint("id"),
+        Index("ix_subsite_site_id_recorded_at", "site_id", "recorded_at"),
+        trigram_index("subsite", "name"),
+        trigram_index("subsite", "description"),
+        trigram_index("subsite", "location"),
+    )
     iterator: int = Field(
         default=None,
         nullable=False,
@@ -76,10 +88,77 @@ class SubSite(SubSiteBase, table=True):
     geom: Any = Field(sa_column=Column(Geometry("POINTZ", srid=4326)))
 
     site: "Site" = Relationship(
-        back_populates="subsites", sa_relationship_kwargs={"lazy": "selectin"}
+        back_populates="subsites", sa_relationship_kwargs={"lazy": "raise"}
     )
 
 
+class SubSiteMeasurement(SQLModel):
+    """Columns of the readings split out of the temperatures and
+    luminosities of a subsite, so that they can be filtered and aggregated
+    in SQL. The JSON columns stay the source of the subsite API."""
+
+    iterator: int = Field(
+        default=None,
+        nullable=False,
+        primary_key=True,
+        index=True,
+    )
+    id: UUID = Field(
+        default_factory=uuid4,
+        index=True,
+        nullable=False,
+    )
+    position: int = Field(
+        title="The order of the reading in the list of the subsite",
+        default=0,
+        nullable=False,
+    )
+
+
+class SubSiteTemperature(
+    SubSiteMeasurement, TemperatureMeasurementBase, table=True
+):
+    __table_args__ = (
+        UniqueConstraint("id"),
+        Index(
+            "ix_subsitetemperature_type_depth_from_surface_cm",
+            "type",
+            "depth_from_surface_cm",
+        ),
+    )
+    subsite_id: UUID = Field(
+        sa_column=Column(
+            GUID(),
+            ForeignKey("subsite.id", ondelete="CASCADE"),
+            nullable=False,
+            index=True,
+        )
+    )
+
+
+class SubSiteLuminosity(
+    SubSiteMeasurement, LuminosityMeasurementBase, table=True
+):
+    __table_args__ = (UniqueConstraint("id"),)
+    subsite_id: UUID = Field(
+        sa_column=Column(
+            GUID(),
+            ForeignKey("subsite.id", ondelete="CASCADE"),
+            nullable=False,
+            index=True,
+        )
+    )
+
+
+class MeasurementSummary(SQLModel):
+    site_id: UUID | None
+    subsite_id: UUID | None  # When grouped by subsite
+    count: int
+    mean: float | None
+    min: float | None
+    max: float | None
+
+
 class SubSiteRead(SubSiteBase):
     id: UUID  # We use the UUID as the return ID
     geom: Any
@@ -93,6 +172,10 @@ class SubSiteRead(SubSiteBase):
     def convert_wkb_to_lat_lon(cls, values: dict) -> dict:
         """Form the geometry from the latitude and longitude and elevation"""
 
+        if isinstance(values["geom"], dict):
+            # Already decoded, as by app.utils.decode_points in list views
+            return values
+
         if isinstance(values["geom"], WKBElement):
             if values["geom"] is not None:
                 shapely_obj = shapely.wkb.loads(str(values["geom"]))
@@ -128,7 +211,7 @@ class SubSiteCreate(SubSiteBase):
             values["geom"] = "POINT({lat} {lon} {elevation})".format(
                 lat=values["latitude"],
                 lon=values["longitude"],
-                elevation=values["elevation"] if values["elevation"] else 0,
+                elevation=values.get("elevation") or 0,
             )
 
         return values
@@ -143,6 +226,8 @@ class SubSiteUpdate(SubSiteBase):
     longitude: float | None
     elevation: float | None
     geom: Any | None
+    temperatures: list[TemperatureMeasurementBase] | None
+    luminosities: list[LuminosityMeasurementBase] | None
 
     @root_validator(pre=True)
     def convert_lat_lon_to_wkt(cls, values: dict) -> dict:
@@ -156,8 +241,8 @@ class SubSiteUpdate(SubSiteBase):
                 lat=values["latitude"],
                 lon=values["longitude"],
                 # Elevation can be None, if so then set to 0
-                elevation=values["elevation"]
-                if values["elevation"] is not None
+                elevation=values.get("elevation")
+                if values.get("elevation") is not None
                 else 0,
             )
 
@@ -1,22 +1,162 @@
-from fastapi import Depends, APIRouter, Query, Response, Body, HTTPException
+from fastapi import (
+    Depends,
+    APIRouter,
+    Query,
+    Response,
+    Body,
+    HTTPException,
+    Request,
+)
+from fastapi.responses import StreamingResponse
 from sqlmodel import select
-from app.db import get_session, AsyncSession
+from app.db import get_session, get_read_session, AsyncSession
 from app.subsites.models import (
     SubSite,
     SubSiteCreate,
     SubSiteRead,
     SubSiteUpdate,
+    SubSiteTemperature,
+    SubSiteLuminosity,
+    MeasurementSummary,
+)
+from app.subsites.measurements import (
+    MeasurementGroup,
+    save_measurements,
+    summarize_measurements,
+)
+from app.query import (
+    ListQuery,
+    TimelineInterval,
+    list_response,
+    filter_params,
+    read_columns,
 )
+from app.config import config
+from app.cache import data_changed
+from app.http_cache import etag, cache_headers, not_modified, vary_encoding
+from app.utils import (
+    decode_points,
+    geojson_feature,
+    stream_feature_collection,
+)
+from app.batch import (
+    validate_items,
+    validate_updates,
+    existing_ids,
+    insert_rows,
+    update_rows,
+)
+from app.models.batch import BatchError, BatchResult
+from app.models.timeline import TimelineCount
+from app.sites.models import Site
+from sqlalchemy import delete
 from uuid import UUID
-from sqlalchemy import func
-import json
+from typing import Any
 
 router = APIRouter()
 
+subsite_list_query = ListQuery(
+    SubSite,
+    resource="subsites",
+    filter_fields=[
+        "id",
+        "name",
+        "description",
+        "site_id",
+        "location",
+        "recorded_at",
+    ],
+    exact_fields=["id", "site_id"],
+    sort_fields=[
+        "id",
+        "name",
+        "description",
+        "site_id",
+        "location",
+        "recorded_at",
+        "created_at",
+    ],
+    columns=read_columns(SubSite, SubSiteRead),
+    geometry=SubSite.geom,
+    search_fields=["name", "description", "location"],
+    range_fields=["recorded_at", "created_at"],
+)
+
+
+@router.get("/timeline", response_model=list[TimelineCount])
+async def get_subsite_timeline(
+    filter: str = Query(None),
+    q: str = Query(None),
+    interval: TimelineInterval = Query("day"),
+    session: AsyncSession = Depends(get_read_session),
+) -> list[TimelineCount]:
+    """Count the subsites recorded per site and per day or week"""
+
+    params = subsite_list_query.parse(filter, None, None, filter_params(q))
+
+    return await subsite_list_query.timeline(session, params, interval)
+
+
+@router.get("/temperatures/summary", response_model=list[MeasurementSummary])
+async def get_temperature_summary(
+    filter: str = Query(None),
+    q: str = Query(None),
+    type: str = Query(None),
+    thermometer_characteristic: str = Query(None),
+    depth_from_surface_cm: str = Query(None),
+    group_by: MeasurementGroup = Query("site"),
+    session: AsyncSession = Depends(get_read_session),
+) -> list[MeasurementSummary]:
+    """Aggregate the temperatures of the subsites matching a filter, such
+    as the mean soil temperature at a depth per site"""
+
+    params = subsite_list_query.parse(filter, None, None, filter_params(q))
+    conditions = [
+        getattr(SubSiteTemperature, field) == value
+        for field, value in {
+            "type": type,
+            "thermometer_characteristic": thermometer_characteristic,
+            "depth_from_surface_cm": depth_from_surface_cm,
+        }.items()
+        if value is not None
+    ]
+
+    return await summarize_measurements(
+        session,
+        subsite_list_query,
+        params,
+        SubSiteTemperature.measurement_celsius,
+        conditions,
+        group_by,
+    )
+
+
+@router.get("/luminosities/summary", response_model=list[MeasurementSummary])
+async def get_luminosity_summary(
+    filter: str = Query(None),
+    q: str = Query(None),
+    group_by: MeasurementGroup = Query("site"),
+    session: AsyncSession = Depends(get_read_session),
+) -> list[MeasurementSummary]:
+    """Aggregate the luminosities of the subsites matching a filter"""
+
+    params = subsite_list_query.parse(filter, None, None, filter_params(q))
+
+    return await summarize_measurements(
+        session,
+        subsite_list_query,
+        params,
+        SubSiteLuminosity.measurement_lux,
+        [],
+        group_by,
+    )
+
 
 @router.get("/{subsite_id}", response_model=SubSiteRead)
 async def get_subsite(
-    session: AsyncSession = Depends(get_session),
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session),
     *,
     subsite_id: UUID,
 ) -> SubSiteRead:
@@ -26,75 +166,111 @@ async def get_subsite(
     )
     subsite = res.scalars().one_or_none()
 
+    if not subsite:
+        raise HTTPException(status_code=404, detail="SubSite not found")
+
+    headers = vary_encoding(request, cache_headers(etag(subsite.dict())))
+    if not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
     return subsite
 
 
+@router.get(".geojson")
+async def get_subsites_geojson(
+    filter: str = Query(None),
+    sort: str = Query(None),
+    range: str = Query(None),
+    q: str = Query(None),
+    bbox: str = Query(None),
+    near: str = Query(None),
+    within_m: float = Query(None),
+    session: AsyncSession = Depends(get_read_session),
+) -> StreamingResponse:
+    """Get the subsites as a GeoJSON FeatureCollection
+
+    The features are built by the database and streamed as they are read,
+    with the same filters as the list endpoint.
+    """
+
+    params = subsite_list_query.parse(
+        filter, sort, range, filter_params(q, bbox, near, within_m)
+    )
+    statement, values = subsite_list_query.select(
+        params,
+        geojson_feature(
+            SubSite.id,
+            SubSite.geom,
+            {
+                "name": SubSite.name,
+                "description": SubSite.description,
+                "site_id": SubSite.site_id,
+                "location": SubSite.location,
+                "recorded_at": SubSite.recorded_at,
+                "created_at": SubSite.created_at,
+                "temperatures": SubSite.temperatures,
+                "luminosities": SubSite.luminosities,
+            },
+        ),
+    )
+
+    return StreamingResponse(
+        stream_feature_collection(await session.stream(statement, values)),
+        media_type="application/geo+json",
+    )
+
+
 @router.get("", response_model=list[SubSiteRead])
 async def get_subsites(
     response: Response,
     filter: str = Query(None),
     sort: str = Query(None),
     range: str = Query(None),
-    session: AsyncSession = Depends(get_session),
+    cursor: str = Query(None),
+    q: str = Query(None),
+    bbox: str = Query(None),
+    near: str = Query(None),
+    within_m: float = Query(None),
+    session: AsyncSession = Depends(get_read_session),
 ):
     """Get all subsites"""
 
-    sort = json.loads(sort) if sort else []
-    range = json.loads(range) if range else []
-    filter = json.loads(filter) if filter else {}
-
-    # Do a query to satisfy total count for "Content-Range" header
-    count_query = select(func.count(SubSite.iterator))
-    if len(filter):  # Have to filter twice for some reason? SQLModel state?
-        for field, value in filter.items():
-            if isinstance(value, list):
-                count_query = count_query.where(
-                    getattr(SubSite, field).in_(value)
-                )
-            elif field == "id" or field == "site_id":
-                count_query = count_query.where(
-                    getattr(SubSite, field) == value
-                )
-            else:
-                count_query = count_query.where(
-                    getattr(SubSite, field).like(f"%{value}%")
-                )
-
-    # Execute total count query (including filter)
-    total_count_query = await session.execute(count_query)
-    total_count = total_count_query.scalar_one()
-
-    query = select(SubSite)
-    # Order by sort field params ie. ["name","ASC"]
-    if len(sort) == 2:
-        sort_field, sort_order = sort
-        if sort_order == "ASC":
-            query = query.order_by(getattr(SubSite, sort_field))
-        else:
-            query = query.order_by(getattr(SubSite, sort_field).desc())
-
-    # Filter by filter field params ie. {"name":"bar"}
-    if len(filter):
-        for field, value in filter.items():
-            if isinstance(value, list):
-                query = query.where(getattr(SubSite, field).in_(value))
-            elif field == "id" or field == "site_id":
-                query = query.where(getattr(SubSite, field) == value)
-            else:
-                query = query.where(getattr(SubSite, field).like(f"%{value}%"))
-
-    if len(range) == 2:
-        start, end = range
-        query = query.offset(start).limit(end - start + 1)
-    else:
-        start, end = [0, total_count]  # For content-range header
-    # Execute query
-    results = await session.execute(query)
-    subsites = results.scalars().all()
-
-    response.headers["Content-Range"] = f"subsites {start}-{end}/{total_count}"
-
-    return subsites
+    if config.FAST_LIST_RESPONSES:
+        rows = await subsite_list_query.paginate(
+            session,
+            response,
+            filter=filter,
+            sort=sort,
+            range=range,
+            cursor=cursor,
+            query_filter=filter_params(q, bbox, near, within_m),
+            as_rows=True,
+        )
+        points = decode_points([row.pop("geom") for row in rows])
+
+        return list_response(
+            response,
+            [{**row, **point} for row, point in zip(rows, points)],
+        )
+
+    subsites = await subsite_list_query.paginate(
+        session,
+        response,
+        filter=filter,
+        sort=sort,
+        range=range,
+        cursor=cursor,
+        query_filter=filter_params(q, bbox, near, within_m),
+    )
+
+    # Decode all geometries at once instead of in each SubSiteRead validator
+    points = decode_points([subsite.geom for subsite in subsites])
+
+    return [
+        {**subsite.dict(), **point}
+        for subsite, point in zip(subsites, points)
+    ]
 
 
 @router.post("", response_model=SubSiteRead)
@@ -106,12 +282,121 @@ async def create_subsite(
     print(subsite)
     subsite = SubSite.from_orm(subsite)
     session.add(subsite)
+    await session.flush()
+    await save_measurements(session, {subsite.id: subsite.dict()})
     await session.commit()
+    data_changed(SubSite)
     await session.refresh(subsite)
 
     return subsite
 
 
+@router.post("/batch", response_model=BatchResult)
+async def create_subsites(
+    subsites: list[Any] = Body(...),
+    session: AsyncSession = Depends(get_session),
+) -> BatchResult:
+    """Creates many subsites in one transaction
+
+    Invalid items are reported by their index and the others are created.
+    """
+
+    valid, errors = validate_items(subsites, SubSiteCreate)
+    site_ids = await existing_ids(
+        session, Site.id, {subsite.site_id for index, subsite in valid}
+    )
+
+    ids = []
+    rows = []
+    for index, subsite in valid:
+        if subsite.site_id not in site_ids:
+            errors.append(BatchError(index=index, detail="Site not found"))
+            continue
+
+        row = SubSite.from_orm(subsite).dict(exclude={"iterator"})
+        ids.append(row["id"])
+        rows.append(row)
+
+    await insert_rows(session, SubSite, rows)
+    await save_measurements(session, {row["id"]: row for row in rows})
+    await session.commit()
+    data_changed(SubSite)
+
+    return BatchResult(
+        ids=ids, errors=sorted(errors, key=lambda error: error.index)
+    )
+
+
+@router.put("/batch", response_model=BatchResult)
+async def update_subsites(
+    subsites: list[Any] = Body(...),
+    session: AsyncSession = Depends(get_session),
+) -> BatchResult:
+    """Updates many subsites in one transaction
+
+    Each item holds the id of the subsite and the fields to update.
+    """
+
+    valid, errors = validate_updates(subsites, SubSiteUpdate)
+    subsite_ids = await existing_ids(
+        session, SubSite.id, {id for index, id, values in valid}
+    )
+    site_ids = await existing_ids(
+        session,
+        Site.id,
+        {values.get("site_id") for index, id, values in valid},
+    )
+
+    updates = {}
+    for index, id, values in valid:
+        if id not in subsite_ids:
+            errors.append(BatchError(index=index, detail="SubSite not found"))
+            continue
+        if "site_id" in values and values["site_id"] not in site_ids:
+            errors.append(BatchError(index=index, detail="Site not found"))
+            continue
+
+        updates.setdefault(id, {}).update(values)
+
+    await update_rows(session, SubSite, updates)
+    await save_measurements(session, updates, replace=True)
+    await session.commit()
+    data_changed(SubSite)
+
+    return BatchResult(
+        ids=list(updates), errors=sorted(errors, key=lambda error: error.index)
+    )
+
+
+@router.delete("/batch", response_model=BatchResult)
+async def delete_subsites(
+    subsite_ids: list[UUID] = Body(...),
+    session: AsyncSession = Depends(get_session),
+) -> BatchResult:
+    """Deletes many subsites by id in one transaction"""
+
+    res = await session.execute(
+        delete(SubSite)
+        .where(SubSite.id.in_(set(subsite_ids)))
+        .returning(SubSite.id)
+    )
+    deleted = set(res.scalars().all())
+
+    ids = []
+    errors = []
+    for index, subsite_id in enumerate(subsite_ids):
+        if subsite_id not in deleted:
+            errors.append(BatchError(index=index, detail="SubSite not found"))
+        elif subsite_id not in ids:
+            ids.append(subsite_id)
+
+    if ids:
+        await session.commit()
+        data_changed(SubSite)
+
+    return BatchResult(ids=ids, errors=errors)
+
+
 @router.put("/{subsite_id}")
 async def update_subsite(
     subsite_id: UUID,
@@ -138,8 +423,10 @@ async def update_subsite(
         setattr(subsite_db, field, value)
 
     session.add(subsite_db)
+    await save_measurements(session, {subsite_id: subsite_data}, replace=True)
 
     await session.commit()
+    data_changed(SubSite)
     await session.refresh(subsite_db)
 
     return subsite_db
@@ -160,3 +447,4 @@ async def delete_subsite(
     if subsite:
         await session.delete(subsite)
         await session.commit()
+        data_changed(SubSite)
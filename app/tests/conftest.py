@@ -1,3 +1,13 @@
+import os
+
+# Settings required by app.config, tests do not connect to this database
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("DB_PORT", "5432")
+os.environ.setdefault("DB_USER", "postgres")
+os.environ.setdefault("DB_PASSWORD", "psql")
+os.environ.setdefault("DB_NAME", "postgres")
+os.environ.setdefault("DB_PREFIX", "sqlite+aiosqlite")
+
 # from fastapi.testclient import TestClient
 # from httpx import AsyncClient
 # from app.main import app
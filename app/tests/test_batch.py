@@ -0,0 +1,62 @@
+from app.batch import validate_items, validate_updates
+from app.sites.models import SiteCreate, SiteUpdate
+from app.subsites.models import SubSite, SubSiteUpdate  # noqa: F401
+from app.licor.models import LICORData  # noqa: F401
+from uuid import uuid4
+
+
+def test_validate_items_reports_errors_by_index():
+    valid, errors = validate_items(
+        [{"name": "a"}, {"name": ["b"]}, {"name": "c"}], SiteCreate
+    )
+
+    assert [index for index, site in valid] == [0, 2]
+    assert [error.index for error in errors] == [1]
+
+
+def test_validate_updates_returns_set_fields():
+    id = uuid4()
+    valid, errors = validate_updates(
+        [
+            {
+                "id": str(id),
+                "name": "a",
+                "latitude": 1,
+                "longitude": 2,
+                "elevation": None,
+            },
+            {"name": "no id"},
+            {"id": "not a uuid"},
+        ],
+        SiteUpdate,
+    )
+
+    assert valid == [(0, id, {"name": "a", "geom": "POINT(1 2 0)"})]
+    assert [error.index for error in errors] == [1, 2]
+
+
+def test_validate_items_reports_items_without_elevation():
+    valid, errors = validate_items(
+        [{"name": "a", "latitude": 1, "longitude": 2}, ["b"]], SiteCreate
+    )
+
+    assert [site.geom for index, site in valid] == ["POINT(1 2 0)"]
+    assert [error.index for error in errors] == [1]
+
+
+def test_validate_updates_is_partial():
+    id = uuid4()
+    valid, errors = validate_updates(
+        [
+            {"id": str(id), "name": "n"},
+            {"id": str(id), "latitude": 1, "longitude": 2},
+            {"id": str(id), "description": None},
+        ],
+        SubSiteUpdate,
+    )
+
+    assert valid == [
+        (0, id, {"name": "n"}),
+        (1, id, {"geom": "POINT(1 2 0)"}),
+    ]
+    assert [error.index for error in errors] == [2]
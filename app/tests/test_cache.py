@@ -0,0 +1,34 @@
+from app.cache import Cache
+
+
+def test_cache_is_bounded_by_size():
+    cache = Cache(max_size=10, sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "xxxx")
+    cache.get("a")  # Now the most recently used
+    cache.set("c", "xxxx")
+
+    assert cache.get("a") == "xxxx"
+    assert cache.get("b") is None
+    assert cache.get("c") == "xxxx"
+    assert cache.size == 8
+
+    cache.set("d", "x" * 11)  # Larger than the cache, so never stored
+
+    assert cache.get("d") is None
+    assert cache.size == 8
+
+
+def test_pop_group():
+    cache = Cache(max_size=3, group=lambda key: key[0])
+    cache.set(("a", 1), "x")
+    cache.set(("a", 2), "x")
+    cache.set(("b", 1), "x")
+    cache.set(("b", 2), "x")  # Evicts ("a", 1)
+
+    cache.pop_group("a")
+
+    assert cache.get(("a", 2)) is None
+    assert cache.get(("b", 1)) == "x"
+    assert cache.size == 2
+    assert set(cache._groups) == {"b"}
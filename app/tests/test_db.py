@@ -0,0 +1,30 @@
+from starlette.requests import Request
+from app.db import READ_PRIMARY_COOKIE, reads_from_primary
+import time
+
+
+def request(*headers: tuple[str, str]) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "headers": [
+                (name.encode(), value.encode()) for name, value in headers
+            ],
+        }
+    )
+
+
+def test_reads_from_primary():
+    until = time.time() + 5
+
+    assert reads_from_primary(request(("x-read-primary", "true")))
+    assert reads_from_primary(
+        request(("cookie", f"{READ_PRIMARY_COOKIE}={until}"))
+    )
+    assert not reads_from_primary(
+        request(("cookie", f"{READ_PRIMARY_COOKIE}={until - 10}"))
+    )
+    assert not reads_from_primary(
+        request(("cookie", f"{READ_PRIMARY_COOKIE}=invalid"))
+    )
+    assert not reads_from_primary(request())
@@ -0,0 +1,56 @@
+from app.licor.downsample import downsample
+
+
+def test_downsample_keeps_columns_aligned():
+    measurements = {
+        "reps": [
+            {
+                "data": {
+                    "SECONDS": list(range(10)),
+                    "CO2": [1, None, 3, 4, 5, 6, 7, 8, 9, 10],
+                    "FLAG": list("abcdefghij"),
+                },
+                "header": {"serial": "x"},
+            }
+        ],
+    }
+
+    data = downsample(measurements, max_points=5)["reps"][0]["data"]
+    assert data == {
+        "SECONDS": [0.5, 2.5, 4.5, 6.5, 8.5],
+        "CO2": [1.0, 3.5, 5.5, 7.5, 9.5],
+        "FLAG": ["a", "c", "e", "g", "i"],
+    }
+
+    data = downsample(measurements, bucket=5, agg="max")["reps"][0]["data"]
+    assert data["CO2"] == [5.0, 10.0]
+
+    data = downsample(measurements, max_points=4, agg="lttb")["reps"][0]
+    assert len(data["data"]["CO2"]) == 4
+    assert data["data"]["SECONDS"][0] == 0
+    assert data["data"]["SECONDS"][-1] == 9
+    assert data["data"]["FLAG"] == [
+        "abcdefghij"[i] for i in data["data"]["SECONDS"]
+    ]
+    assert data["header"] == {"serial": "x"}
+
+
+def test_downsample_short_tables_with_lttb():
+    for length in range(1, 5):
+        data = {"SECONDS": list(range(length)), "CO2": [1.0] * length}
+        reduced = downsample({"data": data}, bucket=2, agg="lttb")["data"]
+
+        assert reduced["SECONDS"][0] == 0
+        assert len(reduced["CO2"]) == min(length, 3)
+
+
+def test_downsample_keeps_metadata_lists():
+    measurements = {
+        "header": {"LABELS": list("abcd"), "GAINS": [1, 2, 3, 4]},
+        "data": {"SECONDS": [0, 1, 2, 3]},
+    }
+
+    assert downsample(measurements, bucket=2) == {
+        "header": {"LABELS": list("abcd"), "GAINS": [1, 2, 3, 4]},
+        "data": {"SECONDS": [0.5, 2.5]},
+    }
@@ -0,0 +1,101 @@
+from app.licor.export import (
+    EXPORT_COLUMNS,
+    export_variables,
+    iter_tables,
+    table_batch,
+    csv_chunks,
+    arrow_chunks,
+    parquet_chunks,
+)
+import pytest
+import io
+
+
+def test_iter_tables_groups_series_by_length():
+    measurements = {
+        "reps": [
+            {
+                "data": {"SECONDS": [0, 1], "CO2": [1.5, None]},
+                "header": {"serial": "x", "LABELS": ["a", "b", "c"]},
+            }
+        ],
+    }
+
+    assert list(iter_tables(measurements)) == [
+        ("reps/0/data", {"SECONDS": [0, 1], "CO2": [1.5, None]}),
+        ("reps/0/header", {"LABELS": ["a", "b", "c"]}),
+    ]
+
+
+def test_export_variables_are_the_union_of_the_manifests():
+    manifests = [
+        (["SECONDS", "CO2", "DATE"], {"SECONDS": {}, "CO2": {}}),
+        (["SECONDS", "H2O", "CO2", "row"], {"SECONDS": {}}),
+    ]
+
+    assert export_variables(manifests) == {
+        "SECONDS": True,
+        "CO2": True,
+        "DATE": False,
+        "H2O": False,
+    }
+
+
+def test_table_batch_is_in_wide_format():
+    batch = table_batch(
+        "id", "a", "data", {"CO2": [1.5, None], "FLAG": ["x", None]}
+    )
+
+    assert batch["row"].tolist() == [0, 1]
+    assert batch["dataset"] == ["a", "a"]
+    assert batch["CO2"][:1].tolist() == [1.5]
+    assert batch["FLAG"] == ["x", None]
+
+
+async def batches():
+    yield table_batch("id", "a", "data", {"CO2": [1.5, None]})
+    yield table_batch("id", "b", "data", {"FLAG": ["x"], "CO2": ["n/a"]})
+
+
+VARIABLES = {"CO2": True, "FLAG": False, "H2O": True}
+
+
+@pytest.mark.asyncio
+async def test_csv_chunks_have_one_column_per_variable():
+    data = b"".join(
+        [chunk async for chunk in csv_chunks(batches(), VARIABLES)]
+    )
+
+    assert data.decode().splitlines() == [
+        "licor_id,dataset,table,row,CO2,FLAG,H2O",
+        "id,a,data,0,1.5,,",
+        "id,a,data,1,,,",
+        "id,b,data,0,n/a,x,",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_arrow_chunks_are_a_stream_of_the_tables():
+    pa = pytest.importorskip("pyarrow")
+
+    chunks = arrow_chunks(batches(), VARIABLES)
+    data = b"".join([chunk async for chunk in chunks])
+    table = pa.ipc.open_stream(data).read_all()
+
+    assert table.column_names == EXPORT_COLUMNS + list(VARIABLES)
+    assert table.column("dataset").to_pylist() == ["a", "a", "b"]
+    assert table.column("CO2").to_pylist() == [1.5, None, None]
+    assert table.column("FLAG").to_pylist() == [None, None, "x"]
+    assert table.column("H2O").null_count == 3
+
+
+@pytest.mark.asyncio
+async def test_parquet_chunks_buffer_the_tables_into_row_groups():
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    chunks = parquet_chunks(batches(), VARIABLES)
+    data = b"".join([chunk async for chunk in chunks])
+    file = pq.ParquetFile(io.BytesIO(data))
+
+    assert file.metadata.num_row_groups == 1
+    assert file.read().column("row").to_pylist() == [0, 1, 0]
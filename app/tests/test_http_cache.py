@@ -0,0 +1,119 @@
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+from app.http_cache import (
+    etag,
+    cache_headers,
+    not_modified,
+    accepts_encoding,
+    vary_encoding,
+    NegotiatedGZipMiddleware,
+)
+from starlette.responses import StreamingResponse
+import datetime
+
+
+def request(**headers: str) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "headers": [
+                (name.replace("_", "-").encode(), value.encode())
+                for name, value in headers.items()
+            ],
+        }
+    )
+
+
+def test_not_modified():
+    created_at = datetime.datetime(2023, 6, 1, 10, 0, 0, 123456)
+    headers = cache_headers(etag("id", created_at), last_modified=created_at)
+
+    assert headers["Last-Modified"] == "Thu, 01 Jun 2023 10:00:00 GMT"
+    assert not_modified(request(if_none_match=headers["ETag"]), headers)
+    assert not_modified(
+        request(if_none_match=f'"x", W/{headers["ETag"]}'), headers
+    )
+    assert not not_modified(request(if_none_match='"x"'), headers)
+    assert not_modified(
+        request(if_modified_since="Thu, 01 Jun 2023 10:00:00 GMT"), headers
+    )
+    assert not not_modified(
+        request(if_modified_since="Thu, 01 Jun 2023 09:59:59 GMT"), headers
+    )
+    assert not not_modified(request(if_modified_since="invalid"), headers)
+    assert not not_modified(request(), headers)
+
+
+def test_etag_changes_with_values():
+    assert etag("a", 1) == etag("a", 1)
+    assert etag("a", 1) != etag("a", 2)
+
+
+def test_accepts_encoding():
+    assert accepts_encoding(request(accept_encoding="gzip, br"), "gzip")
+    assert accepts_encoding(request(accept_encoding="br;q=1, *"), "gzip")
+    assert not accepts_encoding(request(accept_encoding="gzip;q=0"), "gzip")
+    assert not accepts_encoding(
+        request(accept_encoding="*, gzip; q=0.0"), "gzip"
+    )
+    assert not accepts_encoding(request(accept_encoding="br"), "gzip")
+    assert not accepts_encoding(request(), "gzip")
+
+
+def test_gzip_middleware_honours_refused_gzip():
+    app = FastAPI()
+    app.add_middleware(NegotiatedGZipMiddleware, minimum_size=10)
+
+    @app.get("/")
+    def text() -> PlainTextResponse:
+        return PlainTextResponse("x" * 100)
+
+    client = TestClient(app)
+    for accept_encoding, encoding in [
+        ("gzip", "gzip"),
+        ("br, gzip;q=0.5", "gzip"),
+        ("gzip;q=0", None),
+        ("identity", None),
+    ]:
+        response = client.get(
+            "/", headers={"accept-encoding": accept_encoding}
+        )
+
+        assert response.headers.get("content-encoding") == encoding
+        assert response.text == "x" * 100
+
+
+def test_etag_varies_with_encoding():
+    headers = cache_headers(etag("id"))
+    gzip_headers = vary_encoding(request(accept_encoding="gzip"), headers)
+    identity_headers = vary_encoding(request(), headers)
+
+    assert gzip_headers["ETag"] == headers["ETag"][:-1] + '-gzip"'
+    assert identity_headers["ETag"] == headers["ETag"]
+    assert gzip_headers["Vary"] == identity_headers["Vary"]
+    assert not not_modified(
+        request(if_none_match=gzip_headers["ETag"]), identity_headers
+    )
+
+
+def test_gzip_middleware_streams_and_sets_vary_once():
+    app = FastAPI()
+    app.add_middleware(NegotiatedGZipMiddleware, minimum_size=10)
+
+    async def chunks():
+        for _ in range(3):
+            yield b"x" * 100
+
+    @app.get("/stream")
+    def stream() -> StreamingResponse:
+        return StreamingResponse(chunks(), headers={"Vary": "Accept-Encoding"})
+
+    response = TestClient(app).get(
+        "/stream", headers={"accept-encoding": "gzip"}
+    )
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text == "x" * 300
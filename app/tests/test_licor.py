@@ -0,0 +1,67 @@
+from fastapi import Response
+from app.fieldcampaigns.models import FieldCampaign  # noqa: F401, mappers
+from app.subsites.models import SubSite  # noqa: F401
+from app.licor.models import LICORData
+from app.licor.views import licor_list_query
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+import datetime
+import pytest
+
+PAGE_SIZE = 25
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("as_rows", [False, True])
+async def test_list_page_does_not_fetch_licor_files(as_rows):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(LICORData.__table__.create)
+        await connection.execute(
+            insert(LICORData),
+            [
+                {
+                    "id": f"{i:032x}",
+                    "name": f"file {i}",
+                    "recorded_at": datetime.datetime(2024, 1, 1),
+                    "created_at": datetime.datetime(2024, 1, 1),
+                    "data": {"datasets": [{"a": {"x": [0.5] * 20000}}]},
+                }
+                for i in range(PAGE_SIZE)
+            ],
+        )
+
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, many):
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        async with AsyncSession(engine) as session:
+            page = await licor_list_query.paginate(
+                session,
+                Response(),
+                filter=None,
+                sort=None,
+                range=f"[0, {PAGE_SIZE - 1}]",
+                as_rows=as_rows,
+            )
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+        # Run the statements of the page again to measure what they fetched
+        fetched = 0
+        async with engine.connect() as connection:
+            for statement, parameters in statements:
+                result = await connection.exec_driver_sql(
+                    statement, parameters
+                )
+                fetched += sum(
+                    len(str(value)) for row in result.all() for value in row
+                )
+    finally:
+        await engine.dispose()
+
+    assert len(page) == PAGE_SIZE
+    assert fetched < PAGE_SIZE * 500  # Each file is about 100 kB
@@ -0,0 +1,145 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.config import config
+from app.db import get_read_session
+from app.fieldcampaigns.models import FieldCampaign
+from app.sites.models import Site
+from app.subsites.models import SubSite
+from app.licor.models import LICORData  # noqa: F401 (configures mappers)
+from geoalchemy2 import Geometry
+from sqlalchemy import Column, LargeBinary, MetaData, Table, event, insert
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+import pytest
+import pytest_asyncio
+import shapely
+import datetime
+import uuid
+
+
+def blob_table(table: Table) -> Table:
+    """A table for SQLite without SpatiaLite, storing the geometry columns as
+    WKB blobs"""
+
+    return Table(
+        table.name,
+        MetaData(),
+        *[
+            Column(
+                column.name,
+                (
+                    LargeBinary
+                    if isinstance(column.type, Geometry)
+                    else column.type
+                ),
+                primary_key=column.primary_key,
+            )
+            for column in table.columns
+        ],
+    )
+
+
+@pytest_asyncio.fixture
+async def client():
+    engine = create_async_engine("sqlite+aiosqlite://")
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def connect(connection, record):
+        # Geometries are selected with AsEWKB, the blobs are already WKB
+        connection.create_function("AsEWKB", 1, lambda geom: geom)
+
+    field_campaign_id = uuid.uuid4()
+    site_id = uuid.uuid4()
+    created_at = datetime.datetime(2024, 1, 1)
+    site, subsite = blob_table(Site.__table__), blob_table(SubSite.__table__)
+    point = shapely.to_wkb(shapely.Point(6.5, 46.5, 372.0))
+    async with engine.begin() as connection:
+        await connection.run_sync(FieldCampaign.__table__.create)
+        await connection.run_sync(site.create)
+        await connection.run_sync(subsite.create)
+        await connection.execute(
+            insert(FieldCampaign),
+            [
+                {
+                    "id": field_campaign_id,
+                    "name": "Campaign",
+                    "description": "",
+                    "created_at": created_at,
+                }
+            ],
+        )
+        await connection.execute(
+            insert(site),
+            [
+                {
+                    "id": site_id,
+                    "name": "Site A",
+                    "description": "",
+                    "field_campaign_id": field_campaign_id,
+                    "location": "Valley",
+                    "created_at": created_at,
+                    "geom": point,
+                },
+                {
+                    "id": uuid.uuid4(),
+                    "name": "Site B",
+                    "description": "No location",
+                    "field_campaign_id": None,
+                    "location": "",
+                    "created_at": created_at,
+                    "geom": None,
+                },
+            ],
+        )
+        await connection.execute(
+            insert(subsite),
+            [
+                {
+                    "id": uuid.uuid4(),
+                    "name": "Subsite A",
+                    "description": "",
+                    "site_id": site_id,
+                    "location": "Slope",
+                    "recorded_at": created_at,
+                    "temperatures": [{"value": 1.5}],
+                    "luminosities": [],
+                    "created_at": created_at,
+                    "geom": point,
+                }
+            ],
+        )
+
+    async def get_session():
+        async with AsyncSession(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_read_session] = get_session
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(get_read_session)
+        await engine.dispose()
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/sites",
+        "/sites?include=",
+        '/sites?sort=["name", "DESC"]',
+        "/subsites",
+    ],
+)
+def test_fast_list_responses_match_the_models(client, monkeypatch, path):
+    url = f"{config.API_V1_PREFIX}{path}"
+
+    monkeypatch.setattr(config, "FAST_LIST_RESPONSES", False)
+    expected = client.get(url)
+    monkeypatch.setattr(config, "FAST_LIST_RESPONSES", True)
+    response = client.get(url)
+
+    assert expected.status_code == 200
+    assert response.json() == expected.json()
+    assert response.headers["Content-Range"] == (
+        expected.headers["Content-Range"]
+    )
@@ -0,0 +1,38 @@
+from app.licor.manifest import dataset_manifest
+
+
+def test_dataset_manifest_merges_the_tables_of_a_dataset():
+    measurements = {
+        "reps": [
+            {
+                "data": {
+                    "SECONDS": [10, 11, 12],
+                    "CO2": [400.5, None, 402],
+                    "FLAG": ["a", "b", "c"],
+                },
+                "header": {"serial": "x", "LABELS": ["a", "b", "c", "d"]},
+            },
+            {"data": {"SECONDS": [13], "CO2": [399], "FLAG": ["d"]}},
+        ],
+    }
+
+    assert dataset_manifest(measurements) == {
+        "row_count": 4,
+        "columns": ["SECONDS", "CO2", "FLAG"],
+        "ranges": {
+            "SECONDS": {"min": 10.0, "max": 13.0},
+            "CO2": {"min": 399.0, "max": 402.0},
+        },
+        "time_start": 10.0,
+        "time_end": 13.0,
+    }
+
+
+def test_dataset_manifest_without_series():
+    assert dataset_manifest({"data": {"x": [], "y": [None]}}) == {
+        "row_count": 1,
+        "columns": ["x", "y"],
+        "ranges": {},
+        "time_start": None,
+        "time_end": None,
+    }
@@ -0,0 +1,26 @@
+from app.sites.models import Site  # noqa: F401, configures mappers
+from app.licor.models import LICORData  # noqa: F401
+from app.subsites.measurements import measurement_rows
+from uuid import uuid4
+
+
+def test_measurement_rows():
+    subsite_id = uuid4()
+    rows = measurement_rows(
+        "temperatures",
+        subsite_id,
+        [
+            {"measurement_celsius": 12.5, "type": "soil", "extra": 1},
+            {"measurement_celsius": 3.0, "depth_from_surface_cm": "2 to 5"},
+        ],
+    )
+
+    assert [row["position"] for row in rows] == [0, 1]
+    assert all(row["subsite_id"] == subsite_id for row in rows)
+    assert rows[0]["type"] == "soil"
+    assert rows[0]["depth_from_surface_cm"] is None
+    assert rows[1]["measurement_celsius"] == 3.0
+    assert "extra" not in rows[0] and "iterator" not in rows[0]
+    assert rows[0]["id"] != rows[1]["id"]
+
+    assert measurement_rows("luminosities", subsite_id, None) == []
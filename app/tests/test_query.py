@@ -0,0 +1,260 @@
+from fastapi import HTTPException
+from app.fieldcampaigns.models import FieldCampaign
+from app.subsites.models import SubSite  # noqa: F401 (configures mappers)
+from app.licor.models import LICORData  # noqa: F401
+from app.query import ListQuery, filter_params, count_cache
+from app.cache import data_changed
+from app.utils import json_without
+from app.sites.models import Site
+from sqlalchemy.dialects import postgresql
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from fastapi import Response
+import pytest
+import datetime
+
+
+def make_query() -> ListQuery:
+    return ListQuery(
+        FieldCampaign,
+        resource="field_campaigns",
+        filter_fields=["id", "name", "description"],
+        exact_fields=["id"],
+        sort_fields=["id", "name"],
+    )
+
+
+def test_parse_rejects_unknown_fields():
+    query = make_query()
+
+    with pytest.raises(HTTPException) as e:
+        query.parse('{"iterator": 1}', None, None)
+    assert e.value.status_code == 400
+
+    with pytest.raises(HTTPException) as e:
+        query.parse(None, '["created_at", "ASC"]', None)
+    assert e.value.status_code == 400
+
+    with pytest.raises(HTTPException) as e:
+        query.parse(None, '["name", "UP"]', None)
+    assert e.value.status_code == 400
+
+
+def test_filter_values_are_bound_parameters():
+    query = make_query()
+    params = query.parse(
+        '{"name": "bar", "id": "abc", "description": ["a", "b"]}',
+        '["name", "ASC"]',
+        "[0, 9]",
+    )
+
+    assert query.filter_shape(params) == (
+        ("description", "in"),
+        ("id", "eq"),
+        ("name", "like"),
+    )
+    assert query.filter_values(params) == {
+        "filter_name": "%bar%",
+        "filter_id": "abc",
+        "filter_description": ["a", "b"],
+    }
+
+
+def test_statement_is_cached_per_filter_shape():
+    query = make_query()
+    first = query.parse('{"name": "bar"}', None, "[0, 9]")
+    second = query.parse('{"name": "baz"}', None, "[10, 19]")
+    other = query.parse('{"description": "baz"}', None, "[0, 9]")
+
+    assert query._statement(first) is query._statement(second)
+    assert query._statement(first) is not query._statement(other)
+
+
+def test_cursor_round_trip():
+    query = ListQuery(
+        FieldCampaign,
+        resource="field_campaigns",
+        filter_fields=[],
+        sort_fields=["created_at"],
+    )
+    params = query.parse(None, '["created_at", "DESC"]', None)
+    row = FieldCampaign(
+        iterator=42,
+        created_at=datetime.datetime(2023, 11, 28, 15, 24),
+    )
+
+    cursor = query.decode_cursor(query.encode_cursor(row, params, 50), params)
+
+    assert cursor == {"i": 42, "p": 50, "v": row.created_at}
+
+    with pytest.raises(HTTPException) as e:
+        query.decode_cursor("not-a-cursor", params)
+    assert e.value.status_code == 400
+
+
+def test_spatial_filters():
+    query = ListQuery(
+        Site,
+        resource="sites",
+        filter_fields=["name"],
+        geometry=Site.geom,
+    )
+    params = query.parse(
+        '{"name": "a"}',
+        None,
+        None,
+        filter_params(
+            bbox="7.1,46.0,7.5,46.5", near="46.2,7.3", within_m=500
+        ),
+    )
+
+    values = query.filter_values(params)
+    assert values["filter_bbox_minx"] == 7.1
+    assert values["filter_near_latitude"] == 46.2
+    assert values["filter_within_dlat"] == pytest.approx(500 / 111320)
+
+    sql = str(query._statement(params).compile(dialect=postgresql.dialect()))
+    assert "site.geom && ST_MakeEnvelope" in sql
+    assert "ST_DWithin" in sql
+    assert "ORDER BY site.geom <-> ST_SetSRID" in sql
+
+    for spatial in [
+        {"bbox": [1, 2, 3]},
+        {"near": ["46", 7]},
+        {"within_m": 100},
+    ]:
+        with pytest.raises(HTTPException) as e:
+            query.parse(None, None, None, spatial)
+        assert e.value.status_code == 400
+
+    with pytest.raises(HTTPException) as e:
+        make_query().parse('{"bbox": [1, 2, 3, 4]}', None, None)
+    assert e.value.status_code == 400
+
+
+def test_search_filter():
+    query = ListQuery(
+        Site,
+        resource="sites",
+        filter_fields=["name"],
+        search_fields=["name", "description"],
+    )
+    params = query.parse(None, None, None, filter_params(q="50%_a\\b"))
+
+    assert query.filter_shape(params) == (("q", "search"),)
+    values = query.filter_values(params)
+    assert values["filter_q"] == "50%_a\\b"
+    assert values["filter_q_pattern"] == "%50\\%\\_a\\\\b%"
+
+    sql = str(query._statement(params).compile(dialect=postgresql.dialect()))
+    assert "site.name ILIKE %(filter_q_pattern)s ESCAPE '\\\\'" in sql
+    assert "ORDER BY GREATEST(word_similarity(" in sql
+
+    sql = str(query._statement(params).compile())
+    assert "(instr(lower(coalesce(site.name, '')), lower(" in sql
+
+    with pytest.raises(HTTPException) as e:
+        query.parse('{"q": ["a"]}', None, None)
+    assert e.value.status_code == 400
+
+    with pytest.raises(HTTPException) as e:
+        make_query().parse('{"q": "a"}', None, None)
+    assert e.value.status_code == 400
+
+
+def test_range_filters():
+    query = ListQuery(
+        LICORData,
+        resource="licors",
+        filter_fields=["name"],
+        range_fields=["recorded_at"],
+    )
+    params = query.parse(
+        '{"recorded_at_gte": "2024-01-01T01:00:00+01:00",'
+        ' "recorded_at_lt": "2024-02-01"}',
+        None,
+        None,
+    )
+
+    assert query.filter_shape(params) == (
+        ("recorded_at_gte", "gte"),
+        ("recorded_at_lt", "lt"),
+    )
+    assert query.filter_values(params) == {
+        "filter_recorded_at_gte": datetime.datetime(2024, 1, 1),
+        "filter_recorded_at_lt": datetime.datetime(2024, 2, 1),
+    }
+
+    sql = str(query._statement(params).compile(dialect=postgresql.dialect()))
+    assert "licordata.recorded_at >= %(filter_recorded_at_gte)s" in sql
+    assert "licordata.recorded_at < %(filter_recorded_at_lt)s" in sql
+
+    for filter in [
+        '{"recorded_at_gte": "yesterday"}',
+        '{"recorded_at_gte": 1}',
+        '{"name_gte": "a"}',
+    ]:
+        with pytest.raises(HTTPException) as e:
+            query.parse(filter, None, None)
+        assert e.value.status_code == 400
+
+
+def test_json_filters():
+    query = ListQuery(
+        LICORData,
+        resource="licors",
+        filter_fields=["name"],
+        json_fields={"metadata": json_without(LICORData.data, "datasets")},
+    )
+    params = query.parse('{"metadata": {"remark": "a"}}', None, None)
+
+    assert query.filter_shape(params) == (("metadata", "contains"),)
+    assert query.filter_values(params) == {"filter_metadata": {"remark": "a"}}
+
+    sql = str(query._statement(params).compile(dialect=postgresql.dialect()))
+    assert "(licordata.data - 'datasets') @> %(filter_metadata)s" in sql
+
+    with pytest.raises(HTTPException) as e:
+        query.parse('{"metadata": "a"}', None, None)
+    assert e.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_count_is_not_cached_under_a_later_version():
+    query = make_query()
+    engine = create_async_engine("sqlite+aiosqlite://")
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(FieldCampaign.__table__.create)
+            await connection.execute(
+                insert(FieldCampaign),
+                [
+                    {
+                        "id": f"{i:032x}",
+                        "name": f"c{i}",
+                        "description": "",
+                        "created_at": datetime.datetime(2024, 1, 1),
+                    }
+                    for i in range(3)
+                ],
+            )
+
+        # A write is committed while the page is queried
+        def write(*args):
+            data_changed(FieldCampaign)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", write)
+
+        count_cache.clear()
+        async with AsyncSession(engine) as session:
+            response = Response()
+            await query.paginate(session, response, None, None, "[0, 0]")
+    finally:
+        await engine.dispose()
+
+    assert response.headers["Content-Range"] == "field_campaigns 0-0/3"
+    # The count was stored under the version from before the write
+    params = query.parse(None, None, None)
+    assert count_cache.get(query._count_key(params)) is None
+    assert count_cache.size == 1
@@ -0,0 +1,58 @@
+from geoalchemy2 import WKBElement
+from app.sites.models import SiteRead
+from app.subsites.models import SubSite  # noqa: F401 (configures mappers)
+from app.licor.models import LICORData  # noqa: F401
+from app.utils import decode_points, stream_feature_collection
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+import shapely
+import orjson
+import pytest
+
+
+def test_decode_points_matches_read_validator():
+    geoms = [
+        WKBElement(
+            shapely.to_wkb(shapely.Point(46.38, 8.27, 2100.5)), srid=4326
+        ),
+        None,
+        WKBElement(shapely.Point(46.1, 7.2, 0).wkb_hex, srid=4326),
+    ]
+
+    points = decode_points(geoms)
+
+    for geom, point in zip(geoms, points):
+        expected = SiteRead.convert_wkb_to_lat_lon({"geom": geom})
+        assert point["latitude"] == expected["latitude"]
+        assert point["longitude"] == expected["longitude"]
+        assert point["elevation"] == expected["elevation"]
+        assert (point["geom"] is None) == (expected["geom"] is None)
+        if point["geom"] is not None:
+            assert point["geom"]["coordinates"] == tuple(
+                expected["geom"]["coordinates"]
+            )
+
+
+@pytest.mark.asyncio
+async def test_stream_feature_collection():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.connect() as connection:
+        result = await connection.stream(
+            text("""SELECT '{"type": "Feature", "id": 1}'
+                UNION ALL SELECT '{"type": "Feature", "id": 2}'""")
+        )
+        chunks = [
+            chunk
+            async for chunk in stream_feature_collection(
+                result, partition_size=1
+            )
+        ]
+    await engine.dispose()
+
+    assert orjson.loads(b"".join(chunks)) == {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "id": 1},
+            {"type": "Feature", "id": 2},
+        ],
+    }
@@ -0,0 +1,130 @@
+from fastapi import Depends, APIRouter, Response, HTTPException
+from sqlalchemy import text
+from app.db import get_read_session, AsyncSession
+from app.sites.models import Site
+from app.subsites.models import SubSite
+from app.cache import Cache, data_version
+from app.config import config
+
+router = APIRouter()
+
+# Tiles by (layer, z, x, y, data version of the tables of the layer). The
+# data versions are those of this process, so tiles also expire after the
+# TTL to show the writes handled by the other processes.
+tile_cache = Cache(
+    max_size=config.TILE_CACHE_MAX_BYTES,
+    ttl=config.TILE_CACHE_TTL_SECONDS,
+    sizeof=len,
+)
+
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+MAX_ZOOM = 22
+
+# Points are stored as POINT(latitude longitude elevation), so they are
+# flipped before being projected, and the tile envelope is flipped to be
+# compared with the stored points, which lets the GiST index be used
+TILE_QUERY = """
+WITH bounds AS (
+    SELECT
+        ST_TileEnvelope(:z, :x, :y) AS tile,
+        ST_FlipCoordinates(
+            ST_Transform(
+                ST_TileEnvelope(
+                    :z, :x, :y, margin => {buffer}.0 / {extent}
+                ),
+                4326
+            )
+        ) AS search
+)
+SELECT COALESCE(ST_AsMVT(mvt, :layer, {extent}, 'geom'), ''::bytea)
+FROM (
+    SELECT
+        ST_AsMVTGeom(
+            ST_Transform(ST_Force2D(ST_FlipCoordinates(t.geom)), 3857),
+            bounds.tile,
+            {extent},
+            {buffer},
+            true
+        ) AS geom,
+        {attributes}
+    FROM {table} AS t
+    {joins}
+    CROSS JOIN bounds
+    WHERE t.geom && bounds.search
+) AS mvt
+"""
+
+# The models that each layer is read from, and its statement
+LAYERS = {
+    "sites": (
+        [Site],
+        text(
+            TILE_QUERY.format(
+                extent=TILE_EXTENT,
+                buffer=TILE_BUFFER,
+                table="site",
+                joins="",
+                attributes=(
+                    "t.id::text AS id, t.name, "
+                    "t.field_campaign_id::text AS field_campaign_id"
+                ),
+            )
+        ),
+    ),
+    "subsites": (
+        [SubSite, Site],
+        text(
+            TILE_QUERY.format(
+                extent=TILE_EXTENT,
+                buffer=TILE_BUFFER,
+                table="subsite",
+                joins="LEFT JOIN site AS s ON s.id = t.site_id",
+                attributes=(
+                    "t.id::text AS id, t.name, t.site_id::text AS site_id, "
+                    "s.field_campaign_id::text AS field_campaign_id"
+                ),
+            )
+        ),
+    ),
+}
+
+
+@router.get("/{layer}/{z}/{x}/{y}.mvt")
+async def get_tile(
+    session: AsyncSession = Depends(get_read_session),
+    *,
+    layer: str,
+    z: int,
+    x: int,
+    y: int,
+) -> Response:
+    """Get a Mapbox vector tile of the sites or subsites
+
+    The features have the id and name of the records and the id of their
+    field campaign (and site, for subsites).
+    """
+
+    if layer not in LAYERS:
+        raise HTTPException(status_code=404, detail="Layer not found")
+    if not (0 <= z <= MAX_ZOOM and 0 <= x < 2**z and 0 <= y < 2**z):
+        raise HTTPException(status_code=404, detail="Tile not found")
+
+    models, statement = LAYERS[layer]
+    key = (layer, z, x, y, *[data_version(model) for model in models])
+    tile = tile_cache.get(key)
+
+    if tile is None:
+        res = await session.execute(
+            statement, params={"z": z, "x": x, "y": y, "layer": layer}
+        )
+        tile = bytes(res.scalar_one())
+        tile_cache.set(key, tile)
+
+    return Response(
+        content=tile,
+        media_type="application/vnd.mapbox-vector-tile",
+        headers={
+            "Cache-Control": f"public, max-age={config.TILE_CACHE_TTL_SECONDS}"
+        },
+    )
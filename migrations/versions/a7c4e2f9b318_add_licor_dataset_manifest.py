@@ -0,0 +1,167 @@
+"""Add licor dataset manifest
+
+Revision ID: a7c4e2f9b318
+Revises: f5b1c8d3e720
+Create Date: 2026-10-18 19:32:16.805127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+from typing import Any
+import numpy as np
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c4e2f9b318'
+down_revision: Union[str, None] = 'f5b1c8d3e720'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Datasets read at once by the backfill, to bound its memory
+BACKFILL_BATCH_SIZE = 100
+
+
+# The manifest of app.licor.manifest as of this revision, copied so that
+# replaying the migration does not depend on the current app code
+
+
+def numeric_array(column: list) -> Any:
+    array = np.asarray(column)
+    if array.dtype.kind in 'iuf':
+        return array
+
+    if array.dtype.kind == 'O' and all(
+        value is None
+        or (isinstance(value, (int, float)) and not isinstance(value, bool))
+        for value in column
+    ):
+        return array.astype(float)
+
+    return None
+
+
+def data_tables(measurements: Any, key: Any = None) -> Any:
+    """The columns of each table under a "data" key, the lists of scalars
+    of the same length in its dict"""
+
+    if isinstance(measurements, list):
+        for item in measurements:
+            yield from data_tables(item)
+
+    elif isinstance(measurements, dict):
+        tables: dict[int, dict[str, list]] = {}
+        for name, value in measurements.items():
+            if isinstance(value, list) and all(
+                not isinstance(item, (list, dict)) for item in value
+            ):
+                if key == 'data':
+                    tables.setdefault(len(value), {})[name] = value
+            else:
+                yield from data_tables(value, name)
+
+        yield from tables.values()
+
+
+def dataset_manifest(measurements: Any) -> dict[str, Any]:
+    row_count = 0
+    columns: dict[str, None] = {}
+    ranges: dict[str, dict[str, float]] = {}
+
+    for table in data_tables(measurements):
+        row_count += len(next(iter(table.values())))
+
+        for name, column in table.items():
+            columns.setdefault(name)
+            array = numeric_array(column)
+            if array is None or not len(array):
+                continue
+
+            array = array[np.isfinite(array)]
+            if not len(array):
+                continue
+
+            low, high = float(array.min()), float(array.max())
+            if name in ranges:
+                low = min(low, ranges[name]['min'])
+                high = max(high, ranges[name]['max'])
+            ranges[name] = {'min': low, 'max': high}
+
+    time_range = ranges.get('SECONDS', {})
+
+    return {
+        'row_count': row_count,
+        'columns': list(columns),
+        'ranges': ranges,
+        'time_start': time_range.get('min'),
+        'time_end': time_range.get('max'),
+    }
+
+
+def upgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.add_column('licordatasetdata', sa.Column('row_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('licordatasetdata', sa.Column('columns', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column('licordatasetdata', sa.Column('ranges', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column('licordatasetdata', sa.Column('time_start', sa.Float(), nullable=True))
+    op.add_column('licordatasetdata', sa.Column('time_end', sa.Float(), nullable=True))
+    # ### end Alembic commands ###
+
+    # Backfill the manifests from the measurements, as the API computes
+    # them when a file is uploaded
+    datasets = sa.table(
+        'licordatasetdata',
+        sa.column('iterator', sa.Integer()),
+        sa.column('measurements', postgresql.JSONB()),
+        sa.column('row_count', sa.Integer()),
+        sa.column('columns', postgresql.JSONB()),
+        sa.column('ranges', postgresql.JSONB()),
+        sa.column('time_start', sa.Float()),
+        sa.column('time_end', sa.Float()),
+    )
+    update = (
+        datasets.update()
+        .where(datasets.c.iterator == sa.bindparam('b_iterator'))
+        .values(
+            row_count=sa.bindparam('row_count'),
+            columns=sa.bindparam('columns'),
+            ranges=sa.bindparam('ranges'),
+            time_start=sa.bindparam('time_start'),
+            time_end=sa.bindparam('time_end'),
+        )
+    )
+
+    connection = op.get_bind()
+    last_iterator = 0
+    while True:
+        rows = connection.execute(
+            sa.select(datasets.c.iterator, datasets.c.measurements)
+            .where(datasets.c.iterator > last_iterator)
+            .order_by(datasets.c.iterator)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+
+        connection.execute(
+            update,
+            [
+                {'b_iterator': iterator, **dataset_manifest(measurements)}
+                for iterator, measurements in rows
+            ],
+        )
+        last_iterator = rows[-1].iterator
+
+    op.alter_column('licordatasetdata', 'row_count', server_default=None)
+
+
+def downgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_column('licordatasetdata', 'time_end')
+    op.drop_column('licordatasetdata', 'time_start')
+    op.drop_column('licordatasetdata', 'ranges')
+    op.drop_column('licordatasetdata', 'columns')
+    op.drop_column('licordatasetdata', 'row_count')
+    # ### end Alembic commands ###
@@ -0,0 +1,60 @@
+"""Use jsonb columns
+
+Revision ID: f5b1c8d3e720
+Revises: e2f6a9c1d457
+Create Date: 2026-10-18 18:05:44.392871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5b1c8d3e720'
+down_revision: Union[str, None] = 'e2f6a9c1d457'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Columns converted between json and jsonb
+COLUMNS = [
+    ('licordata', 'data'),
+    ('licordatasetdata', 'measurements'),
+    ('subsite', 'temperatures'),
+    ('subsite', 'luminosities'),
+]
+
+
+def upgrade() -> None:
+    for table, column in COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            existing_type=postgresql.JSON(astext_type=sa.Text()),
+            type_=postgresql.JSONB(astext_type=sa.Text()),
+            existing_nullable=True,
+            postgresql_using=f'{column}::jsonb',
+        )
+
+    # Containment filters on the metadata of the uploaded files (the file
+    # without its datasets, as in app.licor.views.licor_metadata)
+    op.execute(
+        "CREATE INDEX ix_licordata_metadata ON licordata "
+        "USING gin ((data - 'datasets') jsonb_path_ops)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_licordata_metadata', table_name='licordata')
+
+    for table, column in COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            existing_type=postgresql.JSONB(astext_type=sa.Text()),
+            type_=postgresql.JSON(astext_type=sa.Text()),
+            existing_nullable=True,
+            postgresql_using=f'{column}::json',
+        )